@@ -0,0 +1,136 @@
+import argparse
+import csv
+import json
+import random
+import sys
+import time
+import tracemalloc
+
+from maze import *
+from planner import DStarLitePlanner
+from search import search
+
+FIELDS = ['algorithm', 'size', 'seed', 'reached', 'steps', 'optimal_steps', 'optimal',
+          'nodes_expanded', 'wall_time', 'peak_memory_kb']
+
+
+# A mover is created once per run and called once per tick with the current position.
+# It returns the next position and the number of nodes it expanded to find it.
+def greedy_mover(maze, start, reward):
+    visited = {start: 1}
+    return lambda pos: (greedy_move(pos, reward, maze, visited), 1)
+
+def search_mover(algorithm):
+    def create(maze, start, reward):
+        def move(pos):
+            path, expanded = search(pos, reward, maze, algorithm)
+            return (path[1] if path and len(path) > 1 else pos), expanded
+        return move
+    return create
+
+def dstar_mover(maze, start, reward):
+    planner = DStarLitePlanner(maze, start, reward)
+
+    def move(pos):
+        before = planner.expanded
+        return planner.next_move(pos), planner.expanded - before
+    return move
+
+def field_mover(maze, start, reward):
+    field = distance_field(maze, [reward])
+    expanded = [int((field >= 0).sum())]
+
+    def move(pos):
+        cost, expanded[0] = expanded[0], 0
+        return field_move(pos, field, maze), cost
+    return move
+
+MOVERS = {
+    'greedy': greedy_mover,
+    'a_star': search_mover('a_star'),
+    'jps': search_mover('jps'),
+    'bidirectional': search_mover('bidirectional'),
+    'dstar': dstar_mover,
+    'field': field_mover,
+}
+
+
+def create_scenario(size, seed):
+    random.seed(seed)
+    maze = prim_maze_generation(size, size)
+    reward = find_free_position(maze)
+    start = find_free_position(maze)
+    return maze, start, reward
+
+# Moves one agent until it reaches the reward or runs out of ticks, without drawing
+def simulate(maze, start, reward, algorithm, max_ticks=None):
+    move = MOVERS[algorithm](maze, start, reward)
+    if max_ticks is None:
+        max_ticks = 10 * maze.width * maze.height
+    pos, steps, expanded = start, 0, 0
+    while pos != reward and steps < max_ticks:
+        pos, cost = move(pos)
+        expanded += cost
+        steps += 1
+    return {'reached': pos == reward, 'steps': steps, 'nodes_expanded': expanded}
+
+def run(algorithm, size, seed, max_ticks=None, measure_memory=True):
+    maze, start, reward = create_scenario(size, seed)
+    optimal_steps = int(distance_field(maze, [reward])[maze.index(start)])
+
+    began = time.perf_counter()
+    result = simulate(maze, start, reward, algorithm, max_ticks)
+    wall_time = time.perf_counter() - began
+
+    # Tracing slows everything down, so memory is measured on a second, identical run
+    peak = None
+    if measure_memory:
+        maze, start, reward = create_scenario(size, seed)
+        tracemalloc.start()
+        simulate(maze, start, reward, algorithm, max_ticks)
+        peak = tracemalloc.get_traced_memory()[1] // 1024
+        tracemalloc.stop()
+
+    result.update(algorithm=algorithm, size=size, seed=seed, optimal_steps=optimal_steps,
+                  optimal=result['reached'] and result['steps'] == optimal_steps,
+                  wall_time=round(wall_time, 6), peak_memory_kb=peak)
+    return {field: result[field] for field in FIELDS}
+
+def run_suite(algorithms, sizes, seeds, max_ticks=None, measure_memory=True):
+    for size in sizes:
+        for seed in seeds:
+            for algorithm in algorithms:
+                yield run(algorithm, size, seed, max_ticks, measure_memory)
+
+def write_results(results, output, output_format):
+    if output_format == 'json':
+        json.dump(list(results), output, indent=2)
+        output.write('\n')
+        return
+    writer = csv.DictWriter(output, fieldnames=FIELDS)
+    writer.writeheader()
+    for result in results:
+        writer.writerow(result)
+        output.flush()
+
+def main():
+    parser = argparse.ArgumentParser(description='Headless maze pathfinding benchmark')
+    parser.add_argument('--algorithms', nargs='+', choices=sorted(MOVERS), default=sorted(MOVERS))
+    parser.add_argument('--sizes', nargs='+', type=int, default=[45, 101])
+    parser.add_argument('--seeds', nargs='+', type=int, default=[0, 1, 2])
+    parser.add_argument('--max-ticks', type=int)
+    parser.add_argument('--format', choices=['csv', 'json'], default='csv')
+    parser.add_argument('--output', help='file to write to instead of stdout')
+    parser.add_argument('--no-memory', action='store_true', help='skip the peak memory run')
+    args = parser.parse_args()
+
+    results = run_suite(args.algorithms, args.sizes, args.seeds, args.max_ticks, not args.no_memory)
+    if args.output:
+        with open(args.output, 'w', newline='') as file:
+            write_results(results, file, args.format)
+    else:
+        write_results(results, sys.stdout, args.format)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+import argparse
+import os
+import random
+import sys
+import tempfile
+
+from grid import Grid
+from maze import *
+from planner import DStarLitePlanner
+from search import SEARCHES, search
+
+# Regression checks for the maze searches, run with `python checks.py [name ...]`. Each
+# check raises AssertionError when it fails. Mazes are seeded, so a failure names a seed
+# that can be replayed.
+
+SIZES = [(9, 9), (21, 15), (31, 31), (12, 7)]
+
+
+# A Prim maze with some extra cells opened, so that there is more than one way around
+def random_maze(seed, openings=0):
+    random.seed(seed)
+    width, height = random.choice(SIZES)
+    maze = prim_maze_generation(width, height)
+    for _ in range(openings):
+        maze.set((random.randrange(width), random.randrange(height)), FREE)
+    return maze
+
+def distance(maze, src, dest):
+    return int(distance_field(maze, [dest])[maze.index(src)])
+
+
+# The planner moves one cell closer to the goal at every step while cells toggle every
+# few ticks and the goal moves, and stays put when the goal cannot be reached. Several
+# moves along the cached path between changes catch keys that stop being lower bounds.
+def check_dstar(seeds=100, ticks=200, interval=8):
+    for seed in range(seeds):
+        random.seed(seed)
+        size = 41 + 4 * random.randrange(11)
+        maze = prim_maze_generation(size, size)
+        for _ in range(seed % 5 * size):
+            maze.set((random.randrange(size), random.randrange(size)), FREE)
+        goal, pos = find_free_position(maze), find_free_position(maze)
+        planner = DStarLitePlanner(maze, pos, goal)
+        for tick in range(ticks):
+            if tick % interval == interval - 1:
+                cells = [(random.randrange(size), random.randrange(size)) for _ in range(size // 4)]
+                cells = [cell for cell in set(cells) if cell != pos and cell != goal]
+                for cell in cells:
+                    maze.set(cell, 1 - maze.passable[maze.index(cell)])
+                planner.cells_changed(cells)
+            if random.random() < 0.01:
+                goal = find_free_position(maze)
+                planner.set_goal(goal)
+
+            before = distance(maze, pos, goal)
+            moved = planner.next_move(pos)
+            if before <= 0:
+                assert moved == pos, 'seed ' + str(seed) + ', tick ' + str(tick) + ': moved without a way to the goal'
+                continue
+            after = distance(maze, moved, goal)
+            assert after == before - 1, \
+                'seed ' + str(seed) + ', tick ' + str(tick) + ': ' + str(before) + ' steps to go, then ' + str(after)
+            pos = moved
+
+
+# Every search returns a valid path of the shortest length, or None exactly when there
+# is no way through, on mazes with and without extra openings
+def check_searches(seeds=300, pairs=5):
+    for seed in range(seeds):
+        maze = random_maze(seed, (seed % 6) ** 2 * 5)
+        for _ in range(pairs):
+            src, dest = find_free_position(maze), find_free_position(maze)
+            shortest = distance(maze, src, dest)
+            for name in SEARCHES:
+                path, _ = search(src, dest, maze, name)
+                where = 'seed ' + str(seed) + ', ' + name + ' from ' + str(src) + ' to ' + str(dest)
+                if path is None:
+                    assert shortest < 0, where + ': no path found'
+                    continue
+                assert path[0] == src and path[-1] == dest, where + ': path does not join them'
+                for pos, step in zip(path, path[1:]):
+                    assert abs(pos[0] - step[0]) + abs(pos[1] - step[1]) == 1 and maze.is_free(step), \
+                        where + ': invalid step ' + str(pos) + ' to ' + str(step)
+                assert len(path) - 1 == shortest, where + ': ' + str(len(path) - 1) + ' steps, shortest is ' + str(shortest)
+
+
+# Eller mazes are spanning trees of their cells, and searching the packed file gives the
+# same paths as searching an in-memory copy
+def check_eller(seeds=60, pairs=3):
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, 'maze.bits')
+    try:
+        for seed in range(seeds):
+            width, height = [(5, 5), (9, 8), (31, 17), (20, 13), (1, 1), (2, 7), (45, 45)][seed % 7]
+            packed = eller_maze_generation(width, height, path, seed)
+            cells = packed.cells.copy()
+            copy = Grid.from_array(cells)
+            free = int(cells.sum())
+            edges = int((cells[:, 1:] & cells[:, :-1]).sum() + (cells[1:] & cells[:-1]).sum())
+            reached = int((distance_field(copy, [(0, 0)]) >= 0).sum())
+            assert edges == free - 1 and reached == free, \
+                'seed ' + str(seed) + ': ' + str(free) + ' cells, ' + str(edges) + ' edges, ' + str(reached) + ' reached'
+
+            random.seed(seed)
+            for _ in range(pairs):
+                src, dest = find_free_position(packed), find_free_position(packed)
+                for name in SEARCHES:
+                    assert search(src, dest, packed, name) == search(src, dest, copy, name), \
+                        'seed ' + str(seed) + ', ' + name + ': paths differ on the packed file'
+            packed.close()
+    finally:
+        if os.path.exists(path):
+            os.remove(path)
+        os.rmdir(directory)
+
+
+CHECKS = {
+    'searches': check_searches,
+    'dstar': check_dstar,
+    'eller': check_eller,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Maze search regression checks')
+    parser.add_argument('checks', nargs='*', metavar='CHECK', help='checks to run, all by default: ' + ', '.join(CHECKS))
+    args = parser.parse_args()
+    for name in args.checks:
+        if name not in CHECKS:
+            parser.error('unknown check ' + name)
+
+    failed = 0
+    for name in args.checks or CHECKS:
+        try:
+            CHECKS[name]()
+        except AssertionError as error:
+            failed += 1
+            print(name + ': FAILED ' + str(error))
+        else:
+            print(name + ': ok')
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+import mmap
+import struct
+from array import array
+
+import numpy as np
+
+WALL = 0
+FREE = 1
+
+ASCII = {WALL: '#', FREE: '.'}
+
+# Header of a bit-packed maze file: magic, width, height
+PACKED_MAGIC = b'MAZEBITS'
+PACKED_HEADER = struct.Struct('<8sQQ')
+
+
+# Per-cell search state (costs, parents) that reads -1 for cells never written
+class SparseCells(dict):
+    def __missing__(self, key):
+        return -1
+
+
+# The maze lives in one flat uint8 buffer, row by row, with a border of walls around it.
+# A cell is addressed by its index in that buffer, its neighbors are that index plus one
+# of `offsets`, and the border makes every neighbor lookup safe without bounds checks.
+# `passable` is the buffer itself for the inner loops; `cells` is a NumPy view of the
+# cells inside the border for everything that works on whole rows or regions.
+class Grid:
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.stride = width + 2
+        self.passable = bytearray(self.stride * (height + 2))
+        self.padded = np.frombuffer(self.passable, dtype=np.uint8).reshape(height + 2, self.stride)
+        self.cells = self.padded[1:-1, 1:-1]
+        self.offsets = (-1, 1, -self.stride, self.stride)
+
+    @classmethod
+    def from_array(cls, cells):
+        height, width = cells.shape
+        grid = Grid(width, height)
+        grid.cells[:] = cells != WALL
+        return grid
+
+    @classmethod
+    def from_ascii(cls, rows):
+        if isinstance(rows, str):
+            rows = rows.split()
+        rows = [list(row) for row in rows]
+        return Grid.from_array(np.array(rows) != ASCII[WALL])
+
+    def to_ascii(self):
+        return '\n'.join(''.join(ASCII[cell] for cell in row) for row in self.cells.tolist())
+
+    def index(self, pos):
+        return (pos[1] + 1) * self.stride + pos[0] + 1
+
+    def position(self, index):
+        y, x = divmod(index, self.stride)
+        return x - 1, y - 1
+
+    def is_free(self, pos):
+        return self.passable[self.index(pos)] == FREE
+
+    def set(self, pos, value):
+        self.passable[self.index(pos)] = value
+
+    # A flat array of per-cell search state, -1 meaning unset
+    def cell_array(self):
+        return array('i', [-1]) * len(self.passable)
+
+
+class PackedCells:
+    __slots__ = ('buffer', 'start', 'size')
+
+    def __init__(self, buffer, start, size):
+        self.buffer = buffer
+        self.start = start
+        self.size = size
+
+    def __getitem__(self, index):
+        return (self.buffer[self.start + (index >> 3)] >> (index & 7)) & 1
+
+    def __len__(self):
+        return self.size
+
+
+# A read-only grid backed by a memory-mapped file with one bit per cell, as written by
+# maze.eller_maze_generation. Rows are padded to whole bytes, which only widens the wall
+# border, so cells are indexed exactly like in Grid and every search works on it
+# unchanged. Search state is kept sparse since a dense array would not fit in memory.
+class PackedGrid(Grid):
+    def __init__(self, path):
+        self.file = open(path, 'rb')
+        self.buffer = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.width, self.height = PACKED_HEADER.unpack_from(self.buffer)
+        if magic != PACKED_MAGIC:
+            self.close()
+            raise ValueError("Not a packed maze file: " + path)
+        self.row_bytes = packed_row_bytes(self.width)
+        self.stride = self.row_bytes * 8
+        self.passable = PackedCells(self.buffer, PACKED_HEADER.size, self.stride * (self.height + 2))
+        self.offsets = (-1, 1, -self.stride, self.stride)
+
+    def close(self):
+        self.buffer.close()
+        self.file.close()
+
+    # Unpacks the whole maze, so only meant for mazes that fit in memory
+    @property
+    def cells(self):
+        packed = np.frombuffer(self.buffer, dtype=np.uint8, offset=PACKED_HEADER.size)
+        rows = np.unpackbits(packed.reshape(self.height + 2, self.row_bytes), axis=1, bitorder='little')
+        return rows[1:-1, 1:self.width + 1]
+
+    def set(self, pos, value):
+        raise TypeError("Packed grids are read-only")
+
+    def cell_array(self):
+        return SparseCells()
+
+
+def packed_row_bytes(width):
+    return (width + 2 + 7) // 8
@@ -0,0 +1,255 @@
+import random
+import heapq
+
+import numpy as np
+
+from grid import Grid, PackedGrid, FREE, PACKED_HEADER, PACKED_MAGIC, packed_row_bytes
+
+
+# Maze generation
+def create_grid(width, height):
+    return Grid(width, height)
+
+def is_valid_cell(x, y, width, height):
+    return 0 <= x < width and 0 <= y < height
+
+def prim_maze_generation(width, height):
+    maze = create_grid(width, height)
+    passable, stride = maze.passable, maze.stride
+
+    start_x, start_y = random.randrange(0, width, 2), random.randrange(0, height, 2)
+    start = maze.index((start_x, start_y))
+
+    # Cells that can still be carved, on even coordinates like the start. The mask has an
+    # extra row of walls above and below the grid so that jumping two cells past the
+    # border still lands inside it.
+    unvisited = bytearray(stride * (height + 4))
+    np.frombuffer(unvisited, dtype=np.uint8).reshape(height + 4, stride)[2:height + 2:2, 1:width + 1:2] = 1
+    unvisited[start + stride] = 0
+    passable[start] = FREE
+
+    # (wall, mask, target) offsets for the four directions
+    steps = [(offset, 2 * offset + stride, 2 * offset) for offset in maze.offsets]
+    frontier = [start]
+    pick = random.random
+    while frontier:
+        # Swap the picked cell to the end so it can be removed in constant time
+        i = int(pick() * len(frontier))
+        current = frontier[i]
+        frontier[i] = frontier[-1]
+        frontier.pop()
+
+        for wall, mask, target in steps:
+            if unvisited[current + mask]:
+                unvisited[current + mask] = 0
+                passable[current + wall] = FREE
+                passable[current + target] = FREE
+                frontier.append(current + target)
+
+    return maze
+
+# Eller's algorithm writes the maze one row at a time, so only the current row of sets is
+# kept in memory and the maze goes straight to a bit-packed file (see grid.PackedGrid).
+# Cells sit on even coordinates like in prim_maze_generation.
+def eller_maze_generation(width, height, path, seed=None, chunk_rows=1024):
+    rng = np.random.default_rng(seed)
+    columns, rows = (width + 1) // 2, (height + 1) // 2
+    row_bytes = packed_row_bytes(width)
+    stride = row_bytes * 8
+
+    def pack(line):
+        return np.packbits(line, bitorder='little').tobytes()
+
+    def find(label):
+        root = label
+        while root in parent:
+            root = parent[root]
+        while label != root:
+            parent[label], label = root, parent[label]
+        return root
+
+    with open(path, 'wb') as file:
+        file.write(PACKED_HEADER.pack(PACKED_MAGIC, width, height))
+        chunk = [bytes(row_bytes)]
+        sets = np.arange(columns)
+        next_set = columns
+
+        for row in range(rows):
+            last = row == rows - 1
+
+            # Join neighbors of different sets at random, and all of them on the last row
+            parent = {}
+            labels = sets.tolist()
+            joins = np.ones(columns - 1, dtype=bool) if last else rng.random(columns - 1) < 0.5
+            right = np.zeros(columns - 1, dtype=bool)
+            for i in np.flatnonzero(joins).tolist():
+                a, b = find(labels[i]), find(labels[i + 1])
+                if a != b:
+                    parent[b] = a
+                    right[i] = True
+            sets = np.array([find(label) for label in labels])
+
+            line = np.zeros(stride, dtype=bool)
+            line[1:2 * columns:2] = True
+            line[2:2 * columns - 1:2] = right
+            chunk.append(pack(line))
+
+            if not last:
+                # Every set continues into the next row through at least one cell
+                down = rng.random(columns) < 0.5
+                order = rng.permutation(columns)
+                members, first = np.unique(sets[order], return_index=True)
+                missing = ~np.isin(members, sets[down])
+                down[order[first[missing]]] = True
+
+                line = np.zeros(stride, dtype=bool)
+                line[1:2 * columns:2] = down
+                chunk.append(pack(line))
+
+                sets = np.where(down, sets, next_set + np.arange(columns))
+                next_set += columns
+
+            if len(chunk) >= chunk_rows:
+                file.write(b''.join(chunk))
+                chunk = []
+
+        # An even height leaves a last row of walls, then comes the border
+        chunk.extend(bytes(row_bytes) for _ in range(height - 2 * rows + 2))
+        file.write(b''.join(chunk))
+
+    return PackedGrid(path)
+
+# Pathfinding algorithms
+def heuristic(a, b):
+    return abs(a[0] - b[0]) + abs(a[1] - b[1])
+
+def neighbors(maze, pos):
+    index = maze.index(pos)
+    passable = maze.passable
+    for offset in maze.offsets:
+        if passable[index + offset]:
+            yield maze.position(index + offset)
+
+def greedy_move(src, dest, maze, visited):
+    next_moves = []
+    for neighbor in neighbors(maze, src):
+        dist = heuristic(neighbor, dest)
+        visit_count = visited.get(neighbor, 0)
+        next_moves.append((dist, visit_count, neighbor))
+
+    if not next_moves:
+        return src
+
+    next_moves.sort(key=lambda x: (x[1], x[0]))  # Sort by visit_count, then by distance
+    next_move = next_moves[0][2]
+
+    visited[next_move] = visited.get(next_move, 0) + 1
+    return next_move
+
+
+# Works on cell indexes of the grid. Costs and parents are kept in per-cell arrays from
+# maze.cell_array, -1 meaning not reached yet; a_star translates them back to positions.
+# Among entries of equal priority the deeper one is expanded first.
+def _a_star(maze, src, dest):
+    passable, offsets, stride = maze.passable, maze.offsets, maze.stride
+    dest_y, dest_x = divmod(dest, stride)
+    src_y, src_x = divmod(src, stride)
+
+    frontier = [(abs(src_x - dest_x) + abs(src_y - dest_y), 0, src)]
+    came_from = maze.cell_array()
+    cost_so_far = maze.cell_array()
+    cost_so_far[src] = 0
+    push, pop = heapq.heappush, heapq.heappop
+    expanded = 0
+
+    while frontier:
+        _, depth, current = pop(frontier)
+        cost = -depth
+
+        if current == dest:
+            break
+        if cost > cost_so_far[current]:
+            continue
+        expanded += 1
+
+        new_cost = cost + 1
+        for offset in offsets:
+            neighbor = current + offset
+            if passable[neighbor]:
+                known = cost_so_far[neighbor]
+                if known < 0 or new_cost < known:
+                    cost_so_far[neighbor] = new_cost
+                    y, x = divmod(neighbor, stride)
+                    push(frontier, (new_cost + abs(x - dest_x) + abs(y - dest_y), -new_cost, neighbor))
+                    came_from[neighbor] = current
+
+    return came_from, cost_so_far, expanded
+
+def a_star(src, dest, maze):
+    came_from, cost_so_far, _ = _a_star(maze, maze.index(src), maze.index(dest))
+    if isinstance(cost_so_far, dict):
+        reached = list(cost_so_far)
+        parents = [came_from[cell] for cell in reached]
+    else:
+        reached = np.flatnonzero(np.frombuffer(cost_so_far, dtype=np.int32) >= 0)
+        parents = np.frombuffer(came_from, dtype=np.int32)[reached].tolist()
+        reached = reached.tolist()
+    position = maze.position
+    return {position(cell): None if parent < 0 else position(parent)
+            for cell, parent in zip(reached, parents)}
+
+def a_star_move(src, dest, maze):
+    src, dest = maze.index(src), maze.index(dest)
+    came_from, cost_so_far, _ = _a_star(maze, src, dest)
+    if cost_so_far[dest] < 0:
+        return maze.position(src)
+
+    current = dest
+    while came_from[current] != src:
+        current = came_from[current]
+
+    return maze.position(current)
+
+def find_free_position(maze):
+    while True:
+        x = random.randint(0, maze.width - 1)
+        y = random.randint(0, maze.height - 1)
+        if maze.is_free((x, y)):
+            return x, y
+
+# Breadth-first distances from the sources to every cell, one whole frontier per step.
+# The result is indexed like maze.passable and is -1 for walls and unreachable cells, so
+# an agent anywhere in the maze finds its next move by looking at its four neighbors.
+def distance_field(maze, sources):
+    passable = np.frombuffer(maze.passable, dtype=np.uint8).astype(bool)
+    offsets = np.array(maze.offsets)
+    field = np.full(len(passable), -1, dtype=np.int32)
+
+    frontier = np.unique([maze.index(source) for source in sources])
+    field[frontier] = 0
+    distance = 0
+    while frontier.size:
+        distance += 1
+        candidates = (frontier[:, None] + offsets).ravel()
+        candidates = np.unique(candidates[passable[candidates] & (field[candidates] < 0)])
+        field[candidates] = distance
+        frontier = candidates
+
+    return field
+
+# Next positions of many agents at once: an (n, 2) array of x, y in, the same out. Agents
+# already at a source or with no way to one stay where they are.
+def field_moves(positions, field, maze):
+    positions = np.asarray(positions)
+    cells = (positions[:, 1] + 1) * maze.stride + positions[:, 0] + 1
+    candidates = cells[:, None] + np.array(maze.offsets)
+    distances = field[candidates].astype(np.int64)
+    distances[distances < 0] = np.iinfo(np.int64).max
+    best = candidates[np.arange(len(cells)), distances.argmin(axis=1)]
+    moving = (field[cells] > 0) & (field[best] == field[cells] - 1)
+    cells = np.where(moving, best, cells)
+    return np.stack([cells % maze.stride - 1, cells // maze.stride - 1], axis=1)
+
+def field_move(src, field, maze):
+    x, y = field_moves([src], field, maze)[0]
+    return int(x), int(y)
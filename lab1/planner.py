@@ -0,0 +1,135 @@
+import heapq
+
+INFINITY = float('inf')
+
+
+# D* Lite (Koenig & Likhachev). The search runs from the goal towards the agent, so when
+# the agent moves or a few cells change only the affected part of the search is redone.
+# The path found is cached and handed out one step per call to next_move; nothing is
+# searched again until the maze or the goal changes.
+class DStarLitePlanner:
+    def __init__(self, maze, start, goal):
+        self.maze = maze
+        self.changed = []
+        self._reset(maze.index(start), maze.index(goal))
+
+    def _reset(self, start, goal):
+        self.start = self.last = start
+        self.goal = goal
+        self.km = 0
+        self.g = {}
+        self.rhs = {goal: 0}
+        self.queue = []
+        self.queued = {}
+        self._push(goal, (self._heuristic(start, goal), 0))
+        self.path = None
+        self.expanded = 0
+
+    def set_goal(self, goal):
+        # The search tree is rooted at the goal, so a new goal starts a new search
+        self._reset(self.start, self.maze.index(goal))
+
+    # Tells the planner which cells of the maze were turned into walls or opened
+    def cells_changed(self, positions):
+        self.changed.extend(self.maze.index(pos) for pos in positions)
+
+    def next_move(self, pos):
+        start = self.maze.index(pos)
+        if start != self.start:
+            self.start = start
+            self.path = None
+
+        if self.changed or self.path is None:
+            # Keys queued so far were computed with the agent at `last`; raising km by the
+            # distance walked since keeps them lower bounds for the agent's new position
+            self.km += self._heuristic(self.last, start)
+            self.last = start
+            for cell in self.changed:
+                self._update(cell)
+                for neighbor in self._neighbors(cell):
+                    self._update(neighbor)
+            self.changed = []
+            self._compute()
+            self.path = self._extract_path()
+            self.step = 0
+
+        if self.step + 1 >= len(self.path):
+            return pos
+        self.step += 1
+        self.start = self.path[self.step]
+        return self.maze.position(self.start)
+
+    def _heuristic(self, a, b):
+        stride = self.maze.stride
+        ay, ax = divmod(a, stride)
+        by, bx = divmod(b, stride)
+        return abs(ax - bx) + abs(ay - by)
+
+    def _neighbors(self, cell):
+        passable = self.maze.passable
+        for offset in self.maze.offsets:
+            if passable[cell + offset]:
+                yield cell + offset
+
+    def _key(self, cell):
+        value = min(self.g.get(cell, INFINITY), self.rhs.get(cell, INFINITY))
+        return value + self._heuristic(self.start, cell) + self.km, value
+
+    def _push(self, cell, key):
+        self.queued[cell] = key
+        heapq.heappush(self.queue, (key, cell))
+
+    def _update(self, cell):
+        if cell != self.goal:
+            if self.maze.passable[cell]:
+                self.rhs[cell] = min((self.g.get(n, INFINITY) + 1 for n in self._neighbors(cell)), default=INFINITY)
+            else:
+                self.rhs[cell] = INFINITY
+        self.queued.pop(cell, None)
+        if self.g.get(cell, INFINITY) != self.rhs.get(cell, INFINITY):
+            self._push(cell, self._key(cell))
+
+    def _top(self):
+        # Entries whose cell was re-queued or removed since are skipped lazily
+        queue, queued = self.queue, self.queued
+        while queue and queued.get(queue[0][1]) != queue[0][0]:
+            heapq.heappop(queue)
+        return queue[0] if queue else ((INFINITY, INFINITY), None)
+
+    def _compute(self):
+        g, rhs, start = self.g, self.rhs, self.start
+        while True:
+            key, cell = self._top()
+            if key >= self._key(start) and rhs.get(start, INFINITY) == g.get(start, INFINITY):
+                break
+            if cell is None:
+                break
+            self.expanded += 1
+
+            new_key = self._key(cell)
+            if key < new_key:
+                self._push(cell, new_key)
+            elif g.get(cell, INFINITY) > rhs.get(cell, INFINITY):
+                heapq.heappop(self.queue)
+                del self.queued[cell]
+                g[cell] = rhs[cell]
+                for neighbor in self._neighbors(cell):
+                    self._update(neighbor)
+            else:
+                heapq.heappop(self.queue)
+                del self.queued[cell]
+                g[cell] = INFINITY
+                self._update(cell)
+                for neighbor in self._neighbors(cell):
+                    self._update(neighbor)
+
+    # Follows the lowest cost neighbors from the agent down to the goal
+    def _extract_path(self):
+        g, cell = self.g, self.start
+        if g.get(cell, INFINITY) == INFINITY:
+            return [cell]
+        path = [cell]
+        while cell != self.goal and len(path) <= g[self.start]:
+            cell = min(self._neighbors(cell), key=lambda n: g.get(n, INFINITY))
+            path.append(cell)
+        return path
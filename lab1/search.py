@@ -0,0 +1,197 @@
+import heapq
+
+from maze import _a_star
+
+# Every search works on cell indexes of the grid (see grid.Grid) and returns the path as a
+# list of indexes from src to dest, or None, together with the number of expanded nodes.
+# Costs and parents live in flat arrays over the grid buffer, -1 meaning not reached, and
+# among entries of equal priority the deeper one is expanded first.
+
+
+def _walk_back(came_from, src, cell):
+    path = [cell]
+    while cell != src:
+        cell = came_from[cell]
+        path.append(cell)
+    path.reverse()
+    return path
+
+
+def a_star_search(maze, src, dest):
+    came_from, cost_so_far, expanded = _a_star(maze, src, dest)
+    if cost_so_far[dest] < 0:
+        return None, expanded
+    return _walk_back(came_from, src, dest), expanded
+
+
+# Jump point search for 4-connected grids: a straight run is followed without putting
+# its cells on the open list until it reaches the goal or a cell where a shortest path
+# may have to turn. Vertical runs also stop where a horizontal run from them would.
+def jump_point_search(maze, src, dest):
+    passable, stride = maze.passable, maze.stride
+    dest_y, dest_x = divmod(dest, stride)
+
+    def jump_horizontal(cell, step):
+        while True:
+            cell += step
+            if not passable[cell]:
+                return -1
+            if cell == dest:
+                return cell
+            if ((passable[cell - stride] and not passable[cell - step - stride])
+                    or (passable[cell + stride] and not passable[cell - step + stride])):
+                return cell
+
+    def jump_vertical(cell, step):
+        while True:
+            cell += step
+            if not passable[cell]:
+                return -1
+            if cell == dest:
+                return cell
+            if ((passable[cell - 1] and not passable[cell - step - 1])
+                    or (passable[cell + 1] and not passable[cell - step + 1])):
+                return cell
+            if jump_horizontal(cell, 1) >= 0 or jump_horizontal(cell, -1) >= 0:
+                return cell
+
+    src_y, src_x = divmod(src, stride)
+    frontier = [(abs(src_x - dest_x) + abs(src_y - dest_y), 0, src)]
+    came_from = maze.cell_array()
+    cost_so_far = maze.cell_array()
+    cost_so_far[src] = 0
+    push, pop = heapq.heappush, heapq.heappop
+    expanded = 0
+
+    while frontier:
+        _, depth, current = pop(frontier)
+        cost = -depth
+
+        if current == dest:
+            break
+        if cost > cost_so_far[current]:
+            continue
+        expanded += 1
+
+        # Only the directions a shortest path through the parent can continue in
+        y, x = divmod(current, stride)
+        if current == src:
+            directions = (-1, 1, -stride, stride)
+        else:
+            parent_y, parent_x = divmod(came_from[current], stride)
+            if parent_y == y:
+                step = 1 if x > parent_x else -1
+                directions = (step, -stride, stride)
+            else:
+                step = stride if y > parent_y else -stride
+                directions = (step, -1, 1)
+
+        for direction in directions:
+            if direction in (1, -1):
+                point = jump_horizontal(current, direction)
+            else:
+                point = jump_vertical(current, direction)
+            if point < 0:
+                continue
+            point_y, point_x = divmod(point, stride)
+            new_cost = cost + abs(point_x - x) + abs(point_y - y)
+            known = cost_so_far[point]
+            if known < 0 or new_cost < known:
+                cost_so_far[point] = new_cost
+                push(frontier, (new_cost + abs(point_x - dest_x) + abs(point_y - dest_y), -new_cost, point))
+                came_from[point] = current
+
+    if cost_so_far[dest] < 0:
+        return None, expanded
+
+    # Fill in the straight runs between consecutive jump points
+    jump_points = _walk_back(came_from, src, dest)
+    path = [src]
+    for point in jump_points[1:]:
+        step = 1 if abs(point - path[-1]) < stride else stride
+        if point < path[-1]:
+            step = -step
+        path.extend(range(path[-1] + step, point + step, step))
+    return path, expanded
+
+
+# A* from both ends at once, always expanding the side with the smaller open list. Every
+# path not found yet runs through an open node of each side, so once the best meeting
+# found costs no more than the larger of the two lowest priorities it is optimal.
+def bidirectional_a_star(maze, src, dest):
+    passable, offsets, stride = maze.passable, maze.offsets, maze.stride
+    if src == dest:
+        return [src], 0
+
+    sides = []
+    for start, goal in ((src, dest), (dest, src)):
+        start_y, start_x = divmod(start, stride)
+        goal_y, goal_x = divmod(goal, stride)
+        came_from = maze.cell_array()
+        cost_so_far = maze.cell_array()
+        cost_so_far[start] = 0
+        frontier = [(abs(start_x - goal_x) + abs(start_y - goal_y), 0, start)]
+        sides.append((frontier, came_from, cost_so_far, goal_x, goal_y))
+
+    push, pop = heapq.heappush, heapq.heappop
+    best, meeting = -1, -1
+    expanded = 0
+
+    while sides[0][0] and sides[1][0]:
+        bound = max(sides[0][0][0][0], sides[1][0][0][0])
+        if best >= 0 and best <= bound:
+            break
+
+        side = 0 if len(sides[0][0]) <= len(sides[1][0]) else 1
+        frontier, came_from, cost_so_far, goal_x, goal_y = sides[side]
+        other_cost = sides[1 - side][2]
+
+        _, depth, current = pop(frontier)
+        cost = -depth
+        if cost > cost_so_far[current]:
+            continue
+        expanded += 1
+
+        new_cost = cost + 1
+        for offset in offsets:
+            neighbor = current + offset
+            if passable[neighbor]:
+                known = cost_so_far[neighbor]
+                if known < 0 or new_cost < known:
+                    cost_so_far[neighbor] = new_cost
+                    y, x = divmod(neighbor, stride)
+                    push(frontier, (new_cost + abs(x - goal_x) + abs(y - goal_y), -new_cost, neighbor))
+                    came_from[neighbor] = current
+                    if other_cost[neighbor] >= 0 and (best < 0 or new_cost + other_cost[neighbor] < best):
+                        best, meeting = new_cost + other_cost[neighbor], neighbor
+
+    if best < 0:
+        return None, expanded
+    forward = _walk_back(sides[0][1], src, meeting)
+    backward = _walk_back(sides[1][1], dest, meeting)
+    return forward + backward[-2::-1], expanded
+
+
+SEARCHES = {
+    'a_star': a_star_search,
+    'jps': jump_point_search,
+    'bidirectional': bidirectional_a_star,
+}
+
+
+def search(src, dest, maze, algorithm='a_star'):
+    if algorithm not in SEARCHES:
+        raise ValueError("Unknown search algorithm: " + str(algorithm))
+    path, expanded = SEARCHES[algorithm](maze, maze.index(src), maze.index(dest))
+    if path is not None:
+        path = [maze.position(cell) for cell in path]
+    return path, expanded
+
+
+def find_path(src, dest, maze, algorithm='a_star'):
+    return search(src, dest, maze, algorithm)[0]
+
+
+def search_move(src, dest, maze, algorithm='a_star'):
+    path = find_path(src, dest, maze, algorithm)
+    return path[1] if path and len(path) > 1 else src
@@ -0,0 +1,171 @@
+from knowledgebase import match_key, instantiate_key
+from symbols import is_variable_symbol
+
+
+def variant(goal):
+    # Goals that differ only in the names of their variables share one table
+    names = {}
+    return tuple(names.setdefault(e, -len(names) - 1) if is_variable_symbol(e) else e for e in goal)
+
+
+# What the evaluation of a goal asks of the loop driving it: the answers of a subgoal,
+# or to record a new answer of its own
+CALL, ANSWER = 0, 1
+
+
+class Frame:
+    __slots__ = ('key', 'goal', 'table', 'index', 'mark', 'low', 'recursive', 'changed', 'evaluation', 'steps')
+
+    def __init__(self, key, goal, table, index, mark):
+        self.key = key
+        self.goal = goal
+        self.table = table
+        self.index = index
+        self.mark = mark
+        self.low = index
+        self.recursive = False
+        self.changed = False
+        self.evaluation = None
+        self.steps = None
+
+
+# Top-down evaluation with tabled subgoals. Every subgoal gets a table of answers. A call
+# to a subgoal that is still being evaluated reads its table instead of recursing, and the
+# oldest subgoal of such a cycle re-evaluates the cycle until its tables stop growing.
+# After that every table in the cycle is complete and is only ever read again.
+#
+# The subgoals being evaluated are kept on an explicit stack of frames rather than the
+# Python stack, so chains of rules any number of subgoals deep can be proved.
+class TabledResolver:
+    def __init__(self, matching_keys, rules_concluding):
+        self.matching_keys = matching_keys
+        self.rules_concluding = rules_concluding
+        self.tables = {}
+        self.complete = set()
+        self.stack = []
+        self.positions = {}
+        self.pending = []
+        self.incomplete = {}
+        self.evaluations = 0
+
+    # Yields the new answers of goal as they are found
+    def solve(self, goal):
+        stack = self.stack
+        base = len(stack)
+        self._call(goal)
+
+        while len(stack) > base:
+            frame = stack[-1]
+            request = next(frame.steps, None)
+            if request is None:
+                if frame.low == frame.index and frame.recursive and frame.changed:
+                    self._start(frame)
+                else:
+                    self._finish(frame)
+            elif request[0] == CALL:
+                self._call(request[1])
+            else:
+                frame.changed = True
+                if frame.index == base:
+                    yield request[1]
+
+    def _link(self, low):
+        frame = self.stack[-1]
+        frame.low = min(frame.low, low)
+        self.stack[low].recursive = True
+
+    # Pushes a frame for goal unless its table can be read as it is
+    def _call(self, goal):
+        key = variant(goal)
+        table = self.tables.setdefault(key, {})
+        if key in self.complete:
+            return
+        if key in self.positions:
+            self._link(self.positions[key])
+            return
+
+        # An incomplete table filled during the current pass over its cycle can be reused
+        seen = self.incomplete.get(key)
+        if seen is not None and seen[0] < len(self.stack) and self.stack[seen[0]].evaluation == seen[1]:
+            self._link(seen[0])
+            return
+
+        frame = Frame(key, goal, table, len(self.stack), len(self.pending))
+        self.stack.append(frame)
+        self.positions[key] = frame.index
+        self.pending.append(key)
+        self._start(frame)
+
+    def _start(self, frame):
+        self.evaluations += 1
+        frame.evaluation = self.evaluations
+        frame.recursive = frame.changed = False
+        frame.steps = self._resolve(frame.goal, frame.table)
+
+    def _finish(self, frame):
+        self.stack.pop()
+        del self.positions[frame.key]
+        if frame.low < frame.index:
+            leader = self.stack[frame.low]
+            self.incomplete[frame.key] = (frame.low, leader.evaluation)
+            self._link(frame.low)
+            self.stack[-1].changed |= frame.changed
+        else:
+            for member in self.pending[frame.mark:]:
+                self.complete.add(member)
+                self.incomplete.pop(member, None)
+            del self.pending[frame.mark:]
+
+    def _resolve(self, goal, table):
+        for key in self.matching_keys(goal):
+            if key not in table and match_key(goal, key) is not None:
+                table[key] = None
+                yield ANSWER, key
+
+        for rule in self.rules_concluding(goal):
+            lhs, rhs = rule.key
+            bindings = self._bind_head(rhs, goal)
+            if bindings is None:
+                continue
+            for bindings in (yield from self._prove_body(lhs, bindings)):
+                answer = instantiate_key(rhs, bindings)
+                if answer not in table and match_key(goal, answer) is not None:
+                    table[answer] = None
+                    yield ANSWER, answer
+
+    @staticmethod
+    def _bind_head(head, goal):
+        # Only the constants of the goal flow into the rule; its variables are checked
+        # against the derived answer afterwards
+        bindings = {}
+        for h, g in zip(head[1:], goal[1:]):
+            if is_variable_symbol(g):
+                continue
+            if is_variable_symbol(h):
+                if bindings.setdefault(h, g) != g:
+                    return None
+            elif h != g:
+                return None
+        return bindings
+
+    @staticmethod
+    def _bound_terms(pattern, bindings):
+        return sum(1 for e in pattern[1:] if not is_variable_symbol(e) or e in bindings)
+
+    def _prove_body(self, lhs, bindings):
+        partial = [bindings]
+        remaining = list(lhs)
+        while remaining and partial:
+            # Prove the most instantiated antecedent next so constants narrow the subgoals
+            pattern = max(remaining, key=lambda p: self._bound_terms(p, partial[0]))
+            remaining.remove(pattern)
+            extended = []
+            for bindings in partial:
+                subgoal = instantiate_key(pattern, bindings)
+                yield CALL, subgoal
+                for answer in list(self.tables[variant(subgoal)]):
+                    match = match_key(pattern, answer, bindings)
+                    if match is not None:
+                        extended.append(match)
+            partial = extended
+        return partial
@@ -0,0 +1,347 @@
+import argparse
+import asyncio
+import io
+import itertools
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+
+from knowledgebase import *
+from reader import FACTS, RULES, ParseError, read_facts, read_rules, read_statements
+
+# Regression checks for the knowledge base, run with `python checks.py [name ...]`.
+# Each check raises AssertionError when it fails. The random programs are seeded, so a
+# failure names a trial that can be replayed.
+
+TRIALS = 200
+QUERIES = (['P', '?x', '?y'], ['Q', '?x', '?x'], ['R', '?z'], ['S', '?a', 'b', '?c'], ['P', 'a', '?y'], ['Q', 'c', 'd'])
+
+
+# Eight facts and four rules over a few small predicates and constants
+def random_program(seed):
+    rng = random.Random(seed)
+    constants = ['a', 'b', 'c', 'd']
+    predicates = [('P', 2), ('Q', 2), ('R', 1), ('S', 3)]
+
+    def atom(terms):
+        name, arity = rng.choice(predicates)
+        return [name] + [rng.choice(terms) for _ in range(arity)]
+
+    facts = [Fact(atom(constants)) for _ in range(8)]
+    rules = []
+    for _ in range(4):
+        lhs = [atom(['?x', '?y', '?z', 'a']) for _ in range(rng.randint(1, 3))]
+        bound = [term for pattern in lhs for term in pattern[1:] if term.startswith('?')] or ['a']
+        rules.append(Rule([lhs, atom(bound)]))
+    return facts, rules
+
+def copies(items):
+    return [type(item).from_key(item.key) for item in items]
+
+def build(engine, items):
+    knowledge_base = KnowledgeBase(engine)
+    for item in copies(items):
+        knowledge_base.add(item)
+    return knowledge_base
+
+def answers(bindings):
+    return sorted(str(binding) for binding in bindings)
+
+
+# Reach c0 and Next c0 c1, ..., Next c(n-1) cn: Reach cn needs a chain of n rule steps
+def chain_knowledge_base(engine, length):
+    knowledge_base = KnowledgeBase(engine)
+    for i in range(length):
+        knowledge_base.add(Fact(['Next', 'c' + str(i), 'c' + str(i + 1)]))
+    knowledge_base.add(Fact(['Reach', 'c0']))
+    knowledge_base.add(Rule([[['Next', '?a', '?b'], ['Reach', '?a']], ['Reach', '?b']]))
+    return knowledge_base
+
+def check_deep_chain(length=1000):
+    for engine in KnowledgeBase.ENGINES:
+        knowledge_base = chain_knowledge_base(engine, length)
+        assert knowledge_base.query(Fact(['Reach', 'c' + str(length)])), engine + ': end of the chain not reached'
+        assert not knowledge_base.query(Fact(['Reach', 'c' + str(length + 1)])), engine + ': reached past the chain'
+        reached = sum(1 for _ in knowledge_base.prove(Fact(['Reach', '?x'])))
+        assert reached == length + 1, engine + ': ' + str(reached) + ' nodes reached'
+
+def fact_names(knowledge_base):
+    return sorted(str(fact) for fact in knowledge_base.facts)
+
+# Every engine, adding one item at a time or loading in bulk, ends up with the same facts
+# and the same answers
+def check_engines():
+    for trial in range(TRIALS):
+        facts, rules = random_program(trial)
+        rng = random.Random(trial)
+        items = facts + rules
+        rng.shuffle(items)
+        reference = build('incremental', items)
+        expected = fact_names(reference)
+
+        for engine in ('incremental', 'rete'):
+            assert fact_names(build(engine, items)) == expected, 'trial ' + str(trial) + ': add with ' + engine
+            knowledge_base = KnowledgeBase(engine)
+            split, rule_split = rng.randint(0, len(facts)), rng.randint(0, len(rules))
+            knowledge_base.load(copies(facts[:split]), copies(rules[:rule_split]))
+            knowledge_base.load(copies(facts[split:]), copies(rules[rule_split:]))
+            assert fact_names(knowledge_base) == expected, 'trial ' + str(trial) + ': load with ' + engine
+
+            # Loading into an engine kept up to date by adds
+            knowledge_base = build(engine, items[:split])
+            rest = copies(items[split:])
+            knowledge_base.load([item for item in rest if isinstance(item, Fact)],
+                                [item for item in rest if isinstance(item, Rule)])
+            assert fact_names(knowledge_base) == expected, 'trial ' + str(trial) + ': add then load with ' + engine
+
+        backward = build('backward', items)
+        for query in QUERIES:
+            expected = answers(reference.query(Fact(query)))
+            assert answers(backward.query(Fact(query))) == expected, 'trial ' + str(trial) + ': backward ' + str(query)
+            assert answers(reference.prove(Fact(query))) == expected, 'trial ' + str(trial) + ': prove ' + str(query)
+
+# Number of ways each head is derived by the rules from the facts, by brute force
+def derivation_counts(rules, facts):
+    counts = {}
+    keys = [fact.key for fact in facts]
+    for rule in rules:
+        lhs, rhs = rule.key
+        for combination in itertools.product(keys, repeat=len(lhs)):
+            bindings = {}
+            for pattern, key in zip(lhs, combination):
+                bindings = match_key(pattern, key, bindings)
+                if bindings is None:
+                    break
+            else:
+                head = instantiate_key(rhs, bindings)
+                counts[head] = counts.get(head, 0) + 1
+    return counts
+
+# Every fact is explained once per distinct way the asserted rules derive it, plus once
+# if it was asserted
+def check_justifications():
+    for trial in range(TRIALS):
+        facts, rules = random_program(trial)
+        for engine in ('rete', 'incremental'):
+            knowledge_base = KnowledgeBase(engine)
+            if trial % 2:
+                knowledge_base.load(copies(facts), copies(rules))
+            else:
+                for item in copies(facts + rules):
+                    knowledge_base.add(item)
+            counts = derivation_counts([rule for rule in knowledge_base.rules if rule.asserted], knowledge_base.facts)
+            for fact in knowledge_base.facts:
+                reasons = len(knowledge_base.explain(fact)[str(fact)])
+                expected = counts.get(fact.key, 0) + fact.asserted
+                assert reasons == expected, 'trial ' + str(trial) + ', ' + engine + ': ' + str(fact) + \
+                    ' explained ' + str(reasons) + ' times, expected ' + str(expected)
+
+# Retracting leaves what building without the retracted items gives
+def check_retract():
+    for trial in range(TRIALS):
+        for engine in KnowledgeBase.ENGINES:
+            facts, rules = random_program(trial)
+            rng = random.Random(trial * 7 + len(engine))
+            knowledge_base = build(engine, facts + rules)
+            dropped = rng.sample(facts + rules, rng.randint(1, 4))
+            for item in dropped:
+                knowledge_base.retract(type(item).from_key(item.key))
+            dropped = {(type(item), item.key) for item in dropped}
+            reference = build('incremental', [item for item in facts + rules if (type(item), item.key) not in dropped])
+            for query in QUERIES:
+                assert answers(knowledge_base.query(Fact(query))) == answers(reference.query(Fact(query))), \
+                    'trial ' + str(trial) + ', ' + engine + ': ' + str(query) + ' after retract'
+
+def state(knowledge_base):
+    return (fact_names(knowledge_base), sorted(str(rule) for rule in knowledge_base.rules),
+            {str(fact): knowledge_base.explain(fact) for fact in knowledge_base.facts})
+
+# An add or load that derives more than max_derivations leaves the knowledge base as it
+# was, and adding the same items again without the limit completes it
+def check_derivation_limit():
+    for trial in range(TRIALS):
+        facts, rules = random_program(trial)
+        rng = random.Random(trial)
+        items = facts + rules
+        rng.shuffle(items)
+        expected = fact_names(build('incremental', items))
+        for engine in ('incremental', 'rete'):
+            knowledge_base = KnowledgeBase(engine, max_derivations=rng.randint(0, 3))
+            for item in copies(items):
+                before = state(knowledge_base)
+                try:
+                    if trial % 2:
+                        knowledge_base.load(*([[item], []] if isinstance(item, Fact) else [[], [item]]))
+                    else:
+                        knowledge_base.add(item)
+                except DerivationLimitExceeded:
+                    assert state(knowledge_base) == before, 'trial ' + str(trial) + ', ' + engine + ': ' + \
+                        str(item) + ' left behind after the limit'
+            knowledge_base.max_derivations = None
+            for item in copies(items):
+                knowledge_base.add(item)
+            assert fact_names(knowledge_base) == expected, 'trial ' + str(trial) + ', ' + engine + ': facts lost'
+
+# Every rule that derived something was matched and timed, whichever engine ran it and
+# whether it was added or loaded, and the rete engine and bulk loads fire each rule once
+# per way it derives a fact
+def check_stats():
+    for trial in range(TRIALS):
+        facts, rules = random_program(trial)
+        for engine, bulk in itertools.product(('incremental', 'rete'), (False, True)):
+            knowledge_base = KnowledgeBase(engine)
+            stats = knowledge_base.enable_stats()
+            if bulk:
+                knowledge_base.load(copies(facts), copies(rules))
+            else:
+                for item in copies(rules + facts):
+                    knowledge_base.add(item)
+            where = 'trial ' + str(trial) + ', ' + engine + (' load' if bulk else ' add')
+            for rule in knowledge_base.rules:
+                if not rule.asserted:
+                    continue
+                rule_stats = stats.rule(rule)
+                if rule_stats.fires or rule_stats.partial_rules:
+                    assert rule_stats.matches and rule_stats.seconds, where + ': ' + str(rule) + ' not counted'
+                if engine == 'rete' or bulk:
+                    expected = sum(derivation_counts([rule], knowledge_base.facts).values())
+                    assert rule_stats.fires == expected, where + ': ' + str(rule) + ' fired ' + \
+                        str(rule_stats.fires) + ' times, expected ' + str(expected)
+
+# The data files parse, every statement prints back as itself and errors carry lines
+def check_reader():
+    for source, kind in ((FACTS, 'fact'), (RULES, 'rule')):
+        with open(source) as file:
+            lines = [line.strip() for line in file if line.strip()]
+        items = list(read_facts(source) if kind == 'fact' else read_rules(source))
+        assert [str(item) for item in items] == [' '.join(line.split()) for line in lines], source + ' does not print back'
+
+    assert [key for _, key in read_statements(['P a&Q a->R a\n'])] == \
+        [key for _, key in read_statements(['P a & Q a -> R a\n'])], 'operators without spaces'
+    for text, line_number in (('P a\n\nP b -> \n', 3), ('P a\nQ b & -> R b\n', 2), ('P a -> Q a -> R a\n', 1)):
+        try:
+            list(read_statements(io.StringIO(text)))
+        except ParseError as error:
+            assert error.line_number == line_number, repr(text) + ' failed on line ' + str(error.line_number)
+        else:
+            raise AssertionError('parsed ' + repr(text))
+    try:
+        list(read_facts(io.StringIO('P a\nP a -> Q a\n')))
+    except ParseError as error:
+        assert error.line_number == 2, 'rule in a fact file reported on line ' + str(error.line_number)
+    else:
+        raise AssertionError('read a rule as a fact')
+
+# Round trip of the data files through a snapshot; a truncated snapshot or a changed
+# source must be refused with ValueError so that callers rebuild
+def check_snapshot():
+    from snapshot import StaleSnapshotError
+
+    directory = tempfile.mkdtemp()
+    try:
+        sources = [shutil.copy(FACTS, directory), shutil.copy(RULES, directory)]
+        path = os.path.join(directory, 'snapshot')
+        knowledge_base = KnowledgeBase()
+        knowledge_base.load(read_facts(sources[0]), read_rules(sources[1]))
+        knowledge_base.save(path, sources)
+        assert fact_names(KnowledgeBase.open(path, sources)) == fact_names(knowledge_base), 'facts differ after open'
+
+        with open(path, 'rb') as file:
+            data = file.read()
+        for size in range(0, len(data), 16):
+            with open(path, 'wb') as file:
+                file.write(data[:size])
+            try:
+                KnowledgeBase.open(path, sources)
+            except ValueError:
+                continue
+            raise AssertionError('opened a snapshot truncated to ' + str(size) + ' bytes')
+
+        with open(path, 'wb') as file:
+            file.write(data)
+        with open(sources[0], 'a') as file:
+            file.write('Extra fact\n')
+        try:
+            KnowledgeBase.open(path, sources)
+        except StaleSnapshotError:
+            pass
+        else:
+            raise AssertionError('opened a snapshot of changed sources')
+    finally:
+        shutil.rmtree(directory)
+
+
+# Answers every explain with an exception, standing in for a command that fails
+class FailingKnowledgeBase(KnowledgeBase):
+    def explain(self, fact):
+        raise RuntimeError('explain failed')
+
+async def server_session(knowledge_base, chunks):
+    from server import handle_client
+
+    server = await asyncio.start_server(lambda reader, writer: handle_client(knowledge_base, reader, writer),
+                                        '127.0.0.1', 0)
+    async with server:
+        reader, writer = await asyncio.open_connection(*server.sockets[0].getsockname()[:2])
+        for chunk in chunks:
+            try:
+                writer.write(chunk)
+                await writer.drain()
+            except ConnectionError:
+                break
+            await asyncio.sleep(0.2)
+        output = await asyncio.wait_for(reader.read(), 5)
+        writer.close()
+    return [json.loads(line) for line in output.splitlines()]
+
+# Quit closes the connection whatever arrives after it, and failing commands are
+# answered with error lines
+def check_server():
+    knowledge_base = FailingKnowledgeBase()
+    knowledge_base.add(Fact(['Wife', 'ann', 'bob']))
+    results = asyncio.run(server_session(knowledge_base, [
+        b'query Wife ?a ?b\nexplain Wife ann bob\nquery Wife \xff ?b\nquit\nquery Wife ?a ?b\n',
+        b'query Wife ?a ?b\n',
+    ]))
+    assert [result['command'] for result in results] == ['query', 'error', 'error'], results
+    assert results[1]['error'] == 'RuntimeError: explain failed', results[1]
+
+
+CHECKS = {
+    'engines': check_engines,
+    'justifications': check_justifications,
+    'retract': check_retract,
+    'derivation_limit': check_derivation_limit,
+    'stats': check_stats,
+    'reader': check_reader,
+    'deep_chain': check_deep_chain,
+    'snapshot': check_snapshot,
+    'server': check_server,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Knowledge base regression checks')
+    parser.add_argument('checks', nargs='*', metavar='CHECK', help='checks to run, all by default: ' + ', '.join(CHECKS))
+    args = parser.parse_args()
+    for name in args.checks:
+        if name not in CHECKS:
+            parser.error('unknown check ' + name)
+
+    failed = 0
+    for name in args.checks or CHECKS:
+        try:
+            CHECKS[name]()
+        except AssertionError as error:
+            failed += 1
+            print(name + ': FAILED ' + str(error))
+        else:
+            print(name + ': ok')
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
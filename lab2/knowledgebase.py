@@ -1,60 +1,719 @@
-class KnowledgeBase:
-    def __init__(self):
-        self.facts = []
-        self.rules = []
+import time
+from collections import deque
+from functools import wraps
+
+from symbols import symbols, is_variable_symbol
+
+
+def match_key(pattern, key, bindings=None):
+    if len(pattern) != len(key) or pattern[0] != key[0]:
+        return None
+    bindings = dict(bindings) if bindings else {}
+    for i in range(1, len(pattern)):
+        element = pattern[i]
+        if is_variable_symbol(element):
+            if bindings.setdefault(element, key[i]) != key[i]:
+                return None
+        elif element != key[i]:
+            return None
+    return bindings
+
+
+def instantiate_key(pattern, bindings):
+    return (pattern[0],) + tuple([bindings.get(e, e) if is_variable_symbol(e) else e for e in pattern[1:]])
+
+
+# The keys of all facts with one signature, indexed lazily by whichever argument
+# positions lookups bind. Rows are dict keys so that a retracted fact is dropped in place.
+class Relation:
+    def __init__(self, keys=()):
+        self.rows = dict.fromkeys(keys)
+        self.indexes = {}
+
+    def add(self, key):
+        self.rows[key] = None
+        for positions, index in self.indexes.items():
+            index.setdefault(tuple(key[p] for p in positions), {})[key] = None
+
+    def remove(self, key):
+        del self.rows[key]
+        for positions, index in self.indexes.items():
+            probe = tuple(key[p] for p in positions)
+            rows = index[probe]
+            del rows[key]
+            if not rows:
+                del index[probe]
+
+    def lookup(self, positions, probe):
+        if not positions:
+            return self.rows
+        index = self.indexes.get(positions)
+        if index is None:
+            index = {}
+            for key in self.rows:
+                index.setdefault(tuple(key[p] for p in positions), {})[key] = None
+            self.indexes[positions] = index
+        return index.get(probe, ())
+
+
+def lookup_relation(relations, pattern, bindings):
+    relation = relations.get((pattern[0], len(pattern) - 1))
+    if relation is None:
+        return ()
+    positions, probe = [], []
+    for position, element in enumerate(pattern[1:], 1):
+        if not is_variable_symbol(element):
+            positions.append(position)
+            probe.append(element)
+        elif element in bindings:
+            positions.append(position)
+            probe.append(bindings[element])
+    return relation.lookup(tuple(positions), tuple(probe))
+
+
+# Loads of fewer items, and of fewer than the facts stored, are run as adds when the
+# engine is up to date
+MAX_ADDED_LOAD = 1000
+
+
+class DerivationLimitExceeded(RuntimeError):
+    pass
+
+
+# Times a public operation while instrumentation is on (see stats.py). Operations run by
+# another one, like the re-adds of a retract, count as part of it.
+def instrumented(operation):
+    def decorate(method):
+        @wraps(method)
+        def timed(self, *args, **kwargs):
+            stats = self._stats
+            if stats is None or stats.active:
+                return method(self, *args, **kwargs)
+            stats.active = True
+            started = time.perf_counter()
+            try:
+                return method(self, *args, **kwargs)
+            finally:
+                stats.active = False
+                stats.operation(operation, time.perf_counter() - started,
+                                self._fact_count(), len(self._rules_by_key))
+        return timed
+    return decorate
 
-    def add(self, item):
-        if isinstance(item, Fact):
-            self._add_logical_fact(item)
-        elif isinstance(item, Rule):
-            self._add_logical_rule(item)
 
-    def _add_logical_fact(self, fact):
-        if fact not in self.facts:
-            self.facts.append(fact)
-            self._derive_facts_from_rules(fact)
+class KnowledgeBase:
+    ENGINES = ('incremental', 'rete', 'backward')
+
+    def __init__(self, engine='incremental', max_derivations=None):
+        if engine not in self.ENGINES:
+            raise ValueError("Unknown inference engine: " + str(engine))
+
+        self.engine = engine
+        # Upper bound on the facts and partial rules a single add or load may derive. One
+        # that derives more is undone before DerivationLimitExceeded reaches the caller.
+        self.max_derivations = max_derivations
+        self._journal = None
+
+        # Every index maps keys to items so that retraction can drop entries in place
+        self._facts_by_key = {}
+        self._facts_by_signature = {}
+        self._rules_by_key = {}
+        self._rules_by_constants = {}
+        self._rules_by_head = {}
+
+        # The backward engine only stores what it is told and derives facts when queried
+        self._forward = engine != 'backward'
+
+        # The Rete engine keeps partial matches in the network instead of partial rules
+        self._network = None
+        if engine == 'rete':
+            from rete import ReteNetwork
+            self._network = ReteNetwork()
+
+        # Relations of the facts by signature, which index them by any argument positions,
+        # each built on first use, and whether the engine state lags behind a bulk load
+        self._relations = {}
+        self._engine_stale = False
+
+        # Snapshot whose fact tables have not all been read yet
+        self._snapshot = None
+
+        # Inference counters and timings, None unless enable_stats was called
+        self._stats = None
+
+    def enable_stats(self, growth_interval=1):
+        from stats import InferenceStats
+
+        if self._stats is None:
+            self._stats = InferenceStats(growth_interval)
+        return self._stats
+
+    def disable_stats(self):
+        stats, self._stats = self._stats, None
+        return stats
+
+    @property
+    def stats(self):
+        return self._stats
+
+    @property
+    def facts(self):
+        self._read_snapshot()
+        return list(self._facts_by_key.values())
+
+    @property
+    def rules(self):
+        return list(self._rules_by_key.values())
+
+    @instrumented('add')
+    def add(self, item):
+        self._read_snapshot()
+        if self._engine_stale:
+            self._prime_engine()
+
+        self._bounded(self._add_items, [item])
+
+    # Runs a change, undoing what it stored if it derives more than max_derivations
+    def _bounded(self, change, *args):
+        journal = self._journal = [] if self.max_derivations is not None else None
+        try:
+            change(*args)
+        except DerivationLimitExceeded:
+            self._roll_back(journal)
+            raise
+        finally:
+            self._journal = None
+
+    def _add_items(self, items):
+        # Derived items go onto the agenda instead of recursing back into add
+        agenda = deque(items)
+        derived = -len(agenda)
+        while agenda:
+            item = agenda.popleft()
+            derived += 1
+            if self.max_derivations is not None and derived > self.max_derivations:
+                raise DerivationLimitExceeded(
+                    "Adding derived more than " + str(self.max_derivations) + " facts and rules")
+
+            if isinstance(item, Fact):
+                self._add_logical_fact(item, agenda)
+            elif isinstance(item, Rule):
+                self._add_logical_rule(item, agenda)
+
+    # Notes a stored item before an add or load changes it, so that one running over
+    # max_derivations can be undone; `new` marks an item the change itself stored
+    def _record(self, item, new=False):
+        if self._journal is not None:
+            self._journal.append((item, None if new else (len(item.relies_on), item.asserted)))
+
+    def _roll_back(self, journal):
+        facts, rules = [], []
+        for item, previous in reversed(journal):
+            if previous is None:
+                (facts if isinstance(item, Fact) else rules).append(item)
+                continue
+            count, asserted = previous
+            del item.relies_on[count:]
+            if item.asserted and not asserted:
+                item.asserted = False
+                if isinstance(item, Rule):
+                    head = item.key[1]
+                    self._rules_by_head.get((head[0], len(head) - 1), {}).pop(item.key, None)
+
+        for fact in facts:
+            self._unindex_fact(fact)
+        for rule in rules:
+            self._unindex_rule(rule)
+        if self._network is not None:
+            self._network.remove(facts, rules)
+        # Dependency lists of the items left keep entries for the dropped ones, which
+        # retract already skips, but the relations may hold keys a load derived before
+        # it was stopped, so they are built again
+        self._relations = {}
+
+    def _add_logical_fact(self, fact, agenda):
+        if fact.key not in self._facts_by_key:
+            self._index_fact(fact)
+            self._record(fact, True)
+            self._link_supports(fact, fact.relies_on)
+            if self._stats is not None:
+                self._stats.derived(fact, True)
+            if self._network is not None:
+                joins = None if self._stats is None else []
+                activations = self._network.add_fact(fact, joins)
+                self._count_joins(joins)
+                self._fire(activations, agenda)
+            elif self._forward:
+                self._derive_facts_from_rules(fact, agenda)
         else:
             self._update_fact_dependencies(fact)
 
-    def _add_logical_rule(self, rule):
-        if rule not in self.rules:
-            self.rules.append(rule)
-            self._derive_facts_from_rule(rule)
+    def _add_logical_rule(self, rule, agenda):
+        if rule.key not in self._rules_by_key:
+            self._index_rule(rule)
+            self._record(rule, True)
+            self._link_supports(rule, rule.relies_on)
+            if self._stats is not None:
+                self._stats.derived(rule, False)
+            if self._network is not None:
+                joins = None if self._stats is None else []
+                activations = self._network.add_rule(rule, joins)
+                self._count_joins(joins)
+                self._fire(activations, agenda)
+            elif self._forward:
+                self._derive_facts_from_rule(rule, agenda)
         else:
             self._update_rule_dependencies(rule)
 
-    def _derive_facts_from_rules(self, fact):
-        for rule in self.rules:
-            self.derive(fact, rule)
+    # Join nodes are shared by the rules whose antecedents start the same way, and their
+    # work counts for every rule that shares them
+    def _count_joins(self, joins):
+        for node, matches, seconds in joins or ():
+            for rule in node.rules:
+                rule_stats = self._stats.rule(rule)
+                rule_stats.matches += matches
+                rule_stats.seconds += seconds
+
+    def _fire(self, activations, agenda):
+        stats = self._stats
+        for rule, key, facts in activations:
+            if stats is None:
+                agenda.append(Fact.from_key(key, [[rule] + list(facts)]))
+                continue
+            started = time.perf_counter()
+            agenda.append(Fact.from_key(key, [[rule] + list(facts)]))
+            rule_stats = stats.rule(rule)
+            rule_stats.fires += 1
+            rule_stats.seconds += time.perf_counter() - started
+
+    # Records the stored item as a dependent of everything in the given justifications
+    @staticmethod
+    def _link_supports(item, justifications):
+        for justification in justifications:
+            for support in justification:
+                if isinstance(item, Fact):
+                    support.relied_facts.append(item)
+                else:
+                    support.relied_rules.append(item)
+
+    @instrumented('load')
+    def load(self, facts=(), rules=()):
+        self._read_snapshot()
+        facts, rules = list(facts), list(rules)
+        # A bulk load leaves the engine to be rebuilt from every stored fact before the
+        # next add or retract. Once it is up to date, a few items are cheaper to add.
+        count = len(facts) + len(rules)
+        if self._forward and not self._engine_stale and count < min(MAX_ADDED_LOAD, len(self._facts_by_key)):
+            self._bounded(self._add_items, rules + facts)
+        else:
+            self._bounded(self._load, facts, rules)
+
+    def _load(self, facts, rules):
+        from seminaive import saturate
+
+        old_rules = [r for r in self.rules if r.asserted]
+        new_rules = []
+        for rule in rules:
+            if rule.key in self._rules_by_key:
+                self._update_rule_dependencies(rule)
+            else:
+                self._index_rule(rule)
+                self._record(rule, True)
+                new_rules.append(rule)
+
+        delta = []
+        for fact in facts:
+            if fact.key in self._facts_by_key:
+                self._update_fact_dependencies(fact)
+            else:
+                self._index_fact(fact)
+                self._record(fact, True)
+                delta.append(fact.key)
+
+        if not self._forward:
+            return
+
+        stats = self._stats
+        relations = self._ensure_relations()
+        derivations = saturate(relations, old_rules, delta, self._facts_by_key.__contains__, new_rules,
+                               self.max_derivations, stats)
+        for rule, head, body in derivations:
+            supports = [self._facts_by_key[key] for key in body]
+            justification = [rule] + supports
+            fact = self._facts_by_key.get(head)
+            if fact is None:
+                fact = Fact.from_key(head, [justification])
+                self._index_fact(fact, False)
+                if stats is not None:
+                    stats.rule(rule).fires += 1
+                    stats.derived(fact, True)
+            else:
+                fact.relies_on.append(justification)
+                if stats is not None:
+                    rule_stats = stats.rule(rule)
+                    rule_stats.fires += 1
+                    rule_stats.redundant += 1
+            self._link_supports(fact, [justification])
+
+        if new_rules or delta:
+            self._engine_stale = True
+
+    # Writes the facts, asserted rules and justifications to a snapshot file. `sources` are
+    # the files the knowledge base was built from; the snapshot is only valid while they
+    # stay unchanged.
+    def save(self, path, sources=()):
+        from snapshot import write_snapshot
+
+        self._read_snapshot()
+        asserted = [r for r in self.rules if r.asserted]
+
+        def justifications(fact):
+            return [(rule, supports) for justification in fact.relies_on
+                    for rule, supports in self._original_justifications(justification) if rule.asserted]
+
+        write_snapshot(path, self.facts, asserted, justifications, sources)
+
+    # Opens a snapshot written by save. Fact tables are read from the mapped file when a
+    # query first needs them and everything else is read before the first change.
+    @classmethod
+    def open(cls, path, sources=(), engine='incremental', max_derivations=None):
+        from snapshot import SnapshotReader
+
+        snapshot = SnapshotReader(path, sources)
+        knowledge_base = cls(engine, max_derivations)
+        for rule in snapshot.rules():
+            knowledge_base._index_rule(rule)
+        knowledge_base._snapshot = snapshot
+        knowledge_base._engine_stale = knowledge_base._forward
+        return knowledge_base
+
+    def _read_table(self, signature):
+        if signature in self._snapshot.tables:
+            for fact in self._snapshot.table(signature):
+                self._index_fact(fact)
+
+    # Counts the facts of the snapshot tables not read yet without reading them
+    def _fact_count(self):
+        count = len(self._facts_by_key)
+        if self._snapshot is not None:
+            count += sum(table[0] for table in self._snapshot.tables.values())
+        return count
+
+    def _read_snapshot(self):
+        snapshot = self._snapshot
+        if snapshot is None:
+            return
+        for signature in list(snapshot.tables):
+            self._read_table(signature)
+        self._snapshot = None
+        for fact, justification in snapshot.justifications():
+            fact.relies_on.append(justification)
+            self._link_supports(fact, [justification])
+        snapshot.close()
+
+    # Rebuilds the partial matches of the active engine from the stored facts and rules
+    # without deriving anything, since a bulk load has already saturated the knowledge base
+    def _prime_engine(self):
+        self._engine_stale = False
+        asserted = [r for r in self.rules if r.asserted]
+        for item in self.facts + asserted:
+            item.relied_rules = []
+
+        if self._network is not None:
+            from rete import ReteNetwork
+            self._network = ReteNetwork()
+            for fact in self.facts:
+                self._network.add_fact(fact)
+            for rule in asserted:
+                self._network.add_rule(rule)
+            return
+
+        self._rules_by_key = {}
+        self._rules_by_constants = {}
+        self._rules_by_head = {}
+        for rule in asserted:
+            rule.relies_on = []
+            self._index_rule(rule)
+
+        agenda = deque(asserted)
+        while agenda:
+            rule = agenda.popleft()
+            lhs, rhs = rule.key
+            if len(lhs) == 1:
+                continue
+            for fact in self._facts_matching(lhs[0]):
+                bindings = match_key(lhs[0], fact.key)
+                if bindings is None:
+                    continue
+                local_lhs = tuple(instantiate_key(p, bindings) for p in lhs[1:])
+                new_rule = Rule.from_key((local_lhs, instantiate_key(rhs, bindings)), [[rule, fact]])
+                stored = self._rules_by_key.get(new_rule.key)
+                if stored is None:
+                    self._index_rule(new_rule)
+                    agenda.append(new_rule)
+                    stored = new_rule
+                else:
+                    stored.relies_on.append([rule, fact])
+                self._link_supports(stored, [[rule, fact]])
+
+        # Facts from a bulk load are justified by whole rule instances. Point them at the
+        # partial rules instead, as add would, so that a partial rule which gains another
+        # justification later passes it on to the facts it derived.
+        for item in self.facts + asserted:
+            item.relied_facts = []
+        for fact in self.facts:
+            justifications = {}
+            for justification in fact.relies_on:
+                for rule, supports in self._original_justifications(justification):
+                    if rule.asserted and len(supports) > 1:
+                        rule = self._partial_rule(rule, supports[:-1])
+                        supports = supports[-1:]
+                    justifications.setdefault((id(rule),) + tuple(id(s) for s in supports), [rule] + supports)
+            fact.relies_on = list(justifications.values())
+            self._link_supports(fact, fact.relies_on)
+
+    # The stored partial rule left after matching the first antecedents to the facts
+    def _partial_rule(self, rule, facts):
+        lhs, rhs = rule.key
+        bindings = {}
+        for pattern, fact in zip(lhs, facts):
+            bindings = match_key(pattern, fact.key, bindings)
+        local_lhs = tuple(instantiate_key(p, bindings) for p in lhs[len(facts):])
+        return self._rules_by_key[(local_lhs, instantiate_key(rhs, bindings))]
+
+    def _relation(self, signature):
+        relation = self._relations.get(signature)
+        if relation is None:
+            relation = self._relations[signature] = Relation(self._facts_by_signature.get(signature, ()))
+        return relation
+
+    def _ensure_relations(self):
+        self._read_snapshot()
+        for signature in self._facts_by_signature:
+            self._relation(signature)
+        return self._relations
+
+    def _matching_keys(self, key):
+        return lookup_relation(self._ensure_relations(), key, {})
+
+    # Derived facts of a bulk load are already in the relations when they get indexed
+    def _index_fact(self, fact, update_relations=True):
+        key = fact.key
+        signature = (key[0], len(key) - 1)
+        if update_relations and signature in self._relations:
+            self._relations[signature].add(key)
+        self._facts_by_key[key] = fact
+        self._facts_by_signature.setdefault(signature, {})[key] = fact
+
+    def _unindex_fact(self, fact):
+        key = fact.key
+        signature = (key[0], len(key) - 1)
+        if signature in self._relations:
+            self._relations[signature].remove(key)
+        del self._facts_by_key[key]
+        del self._facts_by_signature[signature][key]
+
+    # Rules are filed by the constants of their first antecedent: by signature, then by
+    # the positions of the constants, then by their values
+    @staticmethod
+    def _constants(key):
+        positions = tuple(p for p in range(1, len(key)) if not is_variable_symbol(key[p]))
+        return (key[0], len(key) - 1), positions, tuple(key[p] for p in positions)
+
+    def _index_rule(self, rule):
+        head = rule.key[1]
+        if rule.asserted:
+            self._rules_by_head.setdefault((head[0], len(head) - 1), {})[rule.key] = rule
+        self._rules_by_key[rule.key] = rule
+        signature, positions, values = self._constants(rule.key[0][0])
+        by_values = self._rules_by_constants.setdefault(signature, {}).setdefault(positions, {})
+        by_values.setdefault(values, {})[rule.key] = rule
+
+    def _unindex_rule(self, rule):
+        head = rule.key[1]
+        self._rules_by_head.get((head[0], len(head) - 1), {}).pop(rule.key, None)
+        del self._rules_by_key[rule.key]
+        signature, positions, values = self._constants(rule.key[0][0])
+        by_values = self._rules_by_constants[signature][positions]
+        del by_values[values][rule.key]
+        if not by_values[values]:
+            del by_values[values]
+
+    # Facts that can match the pattern, looked up by every argument it binds
+    def _facts_matching(self, key):
+        signature = (key[0], len(key) - 1)
+        if self._snapshot is not None:
+            self._read_table(signature)
+        if signature not in self._facts_by_signature:
+            return []
+        positions, values = self._constants(key)[1:]
+        facts = self._facts_by_key
+        return [facts[k] for k in self._relation(signature).lookup(positions, values)]
+
+    def candidate_facts(self, predicate):
+        return self._facts_matching(predicate.key())
+
+    # Rules whose first antecedent can match the fact: for each set of positions that
+    # the first antecedents of some rules fix, those whose constants the fact has there
+    def candidate_rules(self, fact):
+        key = fact.key
+        rules = []
+        for positions, by_values in self._rules_by_constants.get((key[0], len(key) - 1), {}).items():
+            rules.extend(by_values.get(tuple(key[p] for p in positions), {}).values())
+        return rules
+
+    def _rules_concluding(self, key):
+        return list(self._rules_by_head.get((key[0], len(key) - 1), {}).values())
+
+    def _derive_facts_from_rules(self, fact, agenda):
+        for rule in self.candidate_rules(fact):
+            self.derive(fact, rule, agenda)
 
     def _update_fact_dependencies(self, fact):
-        index = self.facts.index(fact)
+        stored = self._facts_by_key[fact.key]
+        self._record(stored)
+        if self._stats is not None:
+            self._count_redundant(fact)
         if fact.relies_on:
             for f in fact.relies_on:
-                self.facts[index].relies_on.append(f)
-        else:
-            self.facts[index].asserted = True
+                stored.relies_on.append(f)
+            self._link_supports(stored, fact.relies_on)
+        if fact.asserted:
+            stored.asserted = True
 
-    def _derive_facts_from_rule(self, rule):
-        for fact in self.facts:
-            self.derive(fact, rule)
+    def _derive_facts_from_rule(self, rule, agenda):
+        for fact in self._facts_matching(rule.key[0][0]):
+            self.derive(fact, rule, agenda)
 
     def _update_rule_dependencies(self, rule):
-        index = self.rules.index(rule)
+        stored = self._rules_by_key[rule.key]
+        self._record(stored)
+        if self._stats is not None:
+            self._count_redundant(rule)
         if rule.relies_on:
             for f in rule.relies_on:
-                self.rules[index].relies_on.append(f)
+                stored.relies_on.append(f)
+            self._link_supports(stored, rule.relies_on)
+        if rule.asserted:
+            stored.asserted = True
+            head = stored.key[1]
+            self._rules_by_head.setdefault((head[0], len(head) - 1), {})[stored.key] = stored
+
+    def _count_redundant(self, item):
+        for justification in item.relies_on:
+            self._stats.rule(self._rule_origin(justification[0])).redundant += 1
+
+    # The asserted rule a partial rule was instantiated from
+    @staticmethod
+    def _rule_origin(rule):
+        while not rule.asserted and rule.relies_on:
+            rule = rule.relies_on[0][0]
+        return rule
+
+    # Delete and rederive: everything that depends on the retracted item is removed, then
+    # whatever still has a justification built only from surviving items is added back,
+    # which derives the rest of its consequences again
+    @instrumented('retract')
+    def retract(self, item):
+        self._read_snapshot()
+        if self._engine_stale:
+            self._prime_engine()
+
+        if isinstance(item, Fact):
+            stored = self._facts_by_key.get(item.key)
+        elif isinstance(item, Rule):
+            stored = self._rules_by_key.get(item.key)
         else:
-            self.rules[index].asserted = True
+            stored = None
+        if stored is None or not stored.asserted:
+            return False
+
+        stored.asserted = False
+        removed = {id(stored): stored}
+        pending = [stored]
+        while pending:
+            current = pending.pop()
+            for dependent in current.relied_facts + current.relied_rules:
+                # Dependency lists are not pruned on removal, so skip entries that are gone
+                if id(dependent) not in removed and self._is_stored(dependent):
+                    removed[id(dependent)] = dependent
+                    pending.append(dependent)
+
+        facts = [item for item in removed.values() if isinstance(item, Fact)]
+        rules = [item for item in removed.values() if isinstance(item, Rule)]
+        for fact in facts:
+            self._unindex_fact(fact)
+        for rule in rules:
+            self._unindex_rule(rule)
+        if self._network is not None:
+            self._network.remove(facts, rules)
+
+        survivors = []
+        for item in removed.values():
+            item.relies_on = [j for j in item.relies_on if all(id(s) not in removed for s in j)]
+            item.relied_facts = []
+            item.relied_rules = []
+            if item.asserted or item.relies_on:
+                survivors.append(item)
+
+        for item in survivors:
+            self.add(item)
+        return True
 
+    def _is_stored(self, item):
+        if isinstance(item, Fact):
+            return self._facts_by_key.get(item.key) is item
+        return self._rules_by_key.get(item.key) is item
+
+    # Walks the stored justifications from the fact back to asserted facts and returns
+    # them as {fact: [(rule, [supporting facts]), ...]}, with partial rules resolved to
+    # the rules they were instantiated from
+    @instrumented('explain')
+    def explain(self, fact):
+        self._read_snapshot()
+        stored = self._facts_by_key.get(fact.key)
+        if stored is None:
+            return None
+
+        graph = {}
+        pending = [stored]
+        while pending:
+            current = pending.pop()
+            if str(current) in graph:
+                continue
+            reasons = graph[str(current)] = []
+            if current.asserted:
+                reasons.append(('asserted', []))
+            for justification in current.relies_on:
+                for rule, supports in self._original_justifications(justification):
+                    reasons.append((str(rule), [str(s) for s in supports]))
+                    pending.extend(supports)
+        return graph
+
+    @staticmethod
+    def _original_justifications(justification):
+        results = []
+        pending = [(justification[0], list(justification[1:]))]
+        while pending:
+            rule, supports = pending.pop()
+            if rule.asserted or not rule.relies_on:
+                results.append((rule, supports))
+            for parent in rule.relies_on:
+                pending.append((parent[0], list(parent[1:]) + supports))
+        return results
+
+    @instrumented('query')
     def query(self, fact):
+        if isinstance(fact, Fact) and not self._forward:
+            return list(self.prove(fact))
+
         if isinstance(fact, Fact):
-            f = Fact(fact.predicate)
+            key = fact.key
             bindings_lst = []
-            for fact in self.facts:
-                binding = match(f.predicate, fact.predicate)
-                if binding:
-                    bindings_lst.append(binding)
+            for fact in self._facts_matching(key):
+                binding = match_key(key, fact.key)
+                if binding is not None:
+                    bindings_lst.append(Assignments.from_bindings(binding))
 
             return bindings_lst
 
@@ -62,53 +721,127 @@ class KnowledgeBase:
             print("Invalid question:", fact.predicate)
             return []
 
-    def derive(self, fact, rule):
-        bindings = match(rule.lhs[0], fact.predicate)
-        if not bindings:
-            return None
-
-        if len(rule.lhs) == 1:
-            new_fact = Fact(instantiate(rule.rhs, bindings), [[rule, fact]])
-            rule.relied_facts.append(new_fact)
-            fact.relied_facts.append(new_fact)
-            self.add(new_fact)
-        else:
-            local_lhs = [instantiate(rule.lhs[i], bindings) for i in range(1, len(rule.lhs))]
-            local_rhs = instantiate(rule.rhs, bindings)
-            new_rule = Rule([local_lhs, local_rhs], [[rule, fact]])
-            rule.relied_rules.append(new_rule)
-            fact.relied_rules.append(new_rule)
-            self.add(new_rule)
+    # Answers the question goal-first, using only the rules whose conclusion can match it,
+    # and yields the bindings as they are found
+    def prove(self, fact):
+        from backward import TabledResolver
 
+        if not isinstance(fact, Fact):
+            print("Invalid question:", fact.predicate)
+            return
+
+        key = fact.key
+        resolver = TabledResolver(self._matching_keys, self._rules_concluding)
+        for answer in resolver.solve(key):
+            yield Assignments.from_bindings(match_key(key, answer))
+
+    def derive(self, fact, rule, agenda=None):
+        stats = self._stats
+        if stats is not None:
+            started = time.perf_counter()
+
+        lhs, rhs = rule.key
+        bindings = match_key(lhs[0], fact.key)
+        if bindings is not None:
+            add = self.add if agenda is None else agenda.append
+
+            if len(lhs) == 1:
+                add(Fact.from_key(instantiate_key(rhs, bindings), [[rule, fact]]))
+            else:
+                local_lhs = tuple(instantiate_key(p, bindings) for p in lhs[1:])
+                add(Rule.from_key((local_lhs, instantiate_key(rhs, bindings)), [[rule, fact]]))
+
+        if stats is not None:
+            rule_stats = stats.rule(self._rule_origin(rule))
+            rule_stats.matches += 1
+            if bindings is not None:
+                if len(lhs) == 1:
+                    rule_stats.fires += 1
+                else:
+                    rule_stats.partial_rules += 1
+            rule_stats.seconds += time.perf_counter() - started
+        return None
+
+# Rules and facts store their predicates as interned symbol tuples (see symbols.py);
+# the Predicate views below are rebuilt on demand for callers that need them
 class Rule:
+    __slots__ = ('key', 'asserted', 'relies_on', 'relied_facts', 'relied_rules')
+
     def __init__(self, rule, relies_on=None):
         super(Rule, self).__init__()
 
-        if relies_on is None:
-            relies_on = []
-
         # The rule is provided in the form of a list of predicates, separated by an `&` operation
-        self.lhs = [p if isinstance(p, Predicate) else Predicate(p) for p in rule[0]]
+        lhs = [p if isinstance(p, Predicate) else Predicate(p) for p in rule[0]]
 
         # The right side is the predicate that is derived from the rule
-        self.rhs = rule[1] if isinstance(rule[1], Predicate) else Predicate(rule[1])
+        rhs = rule[1] if isinstance(rule[1], Predicate) else Predicate(rule[1])
+        self._initialize((tuple(p.key() for p in lhs), rhs.key()), relies_on)
+
+    @classmethod
+    def from_key(cls, key, relies_on=None):
+        rule = cls.__new__(cls)
+        rule._initialize(key, relies_on)
+        return rule
+
+    def _initialize(self, key, relies_on):
+        self.key = key
         self.asserted = not relies_on
-        self.relies_on = []
+        self.relies_on = list(relies_on) if relies_on else []
         self.relied_facts = []
         self.relied_rules = []
-        for pair in relies_on:
-            self.relies_on.append(pair)
+
+    @property
+    def lhs(self):
+        return [Predicate.from_key(k) for k in self.key[0]]
+
+    @property
+    def rhs(self):
+        return Predicate.from_key(self.key[1])
+
+    def __str__(self):
+        return " & ".join(" ".join(symbols.elements(k)) for k in self.key[0]) + " -> " + " ".join(symbols.elements(self.key[1]))
+
+    def __eq__(self, other):
+        return isinstance(other, Rule) and self.key == other.key
+
+    def __hash__(self):
+        return hash(self.key)
 
 class Fact:
+    __slots__ = ('key', 'asserted', 'relies_on', 'relied_facts', 'relied_rules')
+
     def __init__(self, predicate, relies_on=None):
-        self.predicate = self._ensure_predicate_instance(predicate)
+        if type(predicate) == list and all(type(e) == str for e in predicate):
+            key = symbols.atom(predicate)
+        else:
+            key = self._ensure_predicate_instance(predicate).key()
+        self._initialize(key, relies_on)
+
+    @classmethod
+    def from_key(cls, key, relies_on=None):
+        fact = cls.__new__(cls)
+        fact._initialize(key, relies_on)
+        return fact
+
+    def _initialize(self, key, relies_on):
+        self.key = key
         self.asserted = not relies_on
         self.relies_on = relies_on or []
         self.relied_facts = []
         self.relied_rules = []
 
+    @property
+    def predicate(self):
+        return Predicate.from_key(self.key)
+
+    def __str__(self):
+        return " ".join(symbols.elements(self.key))
+
     def __eq__(self, other):
-        return isinstance(other, Fact) and self.predicate == other.predicate
+        return isinstance(other, Fact) and self.key == other.key
+
+    def __hash__(self):
+        return hash(self.key)
 
     @staticmethod
     def _ensure_predicate_instance(predicate):
@@ -116,6 +849,8 @@ class Fact:
 
 
 class Predicate:
+    __slots__ = ('predicate', 'terms')
+
     def __init__(self, predicates_list=None):
         self.predicate = ""
         self.terms = []
@@ -123,10 +858,20 @@ class Predicate:
         if predicates_list:
             self._initialize_terms_and_predicate(predicates_list)
 
+    @classmethod
+    def from_key(cls, key):
+        return cls(symbols.elements(key))
+
+    def __str__(self):
+        return " ".join([self.predicate] + [t.term.element for t in self.terms])
+
     def __eq__(self, other):
         return (self.predicate == other.predicate
                 and all(st == ot for st, ot in zip(self.terms, other.terms)))
 
+    def key(self):
+        return symbols.atom([self.predicate] + [t.term.element for t in self.terms])
+
     def _initialize_terms_and_predicate(self, predicates_list):
         self.predicate = predicates_list[0]
         self.terms = [self._ensure_term_instance(t) for t in predicates_list[1:]]
@@ -136,6 +881,8 @@ class Predicate:
         return term if isinstance(term, Term) else Term(term)
 
 class Term:
+    __slots__ = ('term',)
+
     def __init__(self, term):
         super(Term, self).__init__()
         # Term is either a variable or a constant
@@ -150,6 +897,8 @@ class Term:
 
 
 class Variable:
+    __slots__ = ('term', 'element')
+
     def __init__(self, element):
         self.term = None
         self.element = element
@@ -171,6 +920,8 @@ class Variable:
 
 
 class Constant:
+    __slots__ = ('term', 'element')
+
     def __init__(self, element):
         self.term = None
         self.element = element
@@ -184,6 +935,8 @@ class Constant:
 
 # Struct used to build assignments for quering the knowledge base
 class Assignment:
+    __slots__ = ('variable', 'value')
+
     def __init__(self, variable, value):
         super(Assignment, self).__init__()
         self.variable = variable
@@ -206,6 +959,15 @@ class Assignments:
     def __getitem__(self, key):
         return self.mapping[key] if (self.mapping and key in self.mapping) else None
 
+    @classmethod
+    def from_bindings(cls, bindings):
+        assignments = cls()
+        for variable, value in bindings.items():
+            value = symbols.name(value)
+            assignments.assign(Variable(symbols.name(variable)),
+                               Variable(value) if Variable.is_variable(value) else Constant(value))
+        return assignments
+
     def assign(self, variable, value):
         self.mapping[variable.element] = value.element
         self.assignments.append(Assignment(variable, value))
@@ -218,34 +980,31 @@ class Assignments:
         return False
 
     def test_and_bind(self, variable_term, value_term):
-        bound = self.is_assigned_to(variable_term.term)
+        bound = self.mapping.get(variable_term.term.element)
         if bound:
-            return value_term.term == bound
+            return value_term.term.element == bound
 
         self.assign(variable_term.term, value_term.term)
         return True
 
 
 def match(state1, state2, bindings=None):
-    if len(state1.terms) != len(state2.terms) or state1.predicate != state2.predicate:
+    terms1, terms2 = state1.terms, state2.terms
+    if len(terms1) != len(terms2) or state1.predicate != state2.predicate:
         return False
     if not bindings:
         bindings = Assignments()
-    return match_recursive(state1.terms, state2.terms, bindings)
-
 
-def match_recursive(terms1, terms2, bindings):
-    if len(terms1) == 0:
-        return bindings
-    if Variable.is_variable(terms1[0]):
-        if not bindings.test_and_bind(terms1[0], terms2[0]):
+    for i in range(len(terms1)):
+        if Variable.is_variable(terms1[i]):
+            if not bindings.test_and_bind(terms1[i], terms2[i]):
+                return False
+        elif Variable.is_variable(terms2[i]):
+            if not bindings.test_and_bind(terms2[i], terms1[i]):
+                return False
+        elif terms1[i].term.element != terms2[i].term.element:
             return False
-    elif Variable.is_variable(terms2[0]):
-        if not bindings.test_and_bind(terms2[0], terms1[0]):
-            return False
-    elif terms1[0] != terms2[0]:
-        return False
-    return match_recursive(terms1[1:], terms2[1:], bindings)
+    return bindings
 
 
 def instantiate(statement, bindings):
@@ -257,4 +1016,4 @@ def instantiate(statement, bindings):
             return term
 
     new_terms = [handle_term(t) for t in statement.terms]
-    return Predicate([statement.predicate] + new_terms)
\ No newline at end of file
+    return Predicate([statement.predicate] + new_terms)
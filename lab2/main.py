@@ -1,26 +1,82 @@
+import argparse
+import asyncio
+import sys
+
 from reader import *
 from knowledgebase import *
 
+SNAPSHOT = 'data/snapshot'
+SOURCES = (FACTS, RULES)
+
+
 def main():
-    knowledge_base = KnowledgeBase()
-    pre_knowledge = parse_input_files()
+    parser = argparse.ArgumentParser(description='Forward chaining knowledge base')
+    parser.add_argument('--batch', metavar='FILE', nargs='?', const='-',
+                        help='run the commands of FILE (stdin if omitted) and print JSON lines')
+    parser.add_argument('--serve', action='store_true', help='answer commands from local socket clients')
+    parser.add_argument('--port', type=int, default=7878)
+    parser.add_argument('--stats', metavar='FILE', help='write inference counters and timings to FILE as JSON')
+    args = parser.parse_args()
+
+    knowledge_base = open_knowledge_base(args.stats is not None)
+
+    try:
+        if args.serve:
+            from server import serve
+            asyncio.run(serve(knowledge_base, port=args.port))
+        elif args.batch is not None:
+            from server import run_batch
+            if args.batch == '-':
+                run_batch(knowledge_base, sys.stdin.buffer, sys.stdout)
+            else:
+                with open(args.batch, 'rb') as file:
+                    run_batch(knowledge_base, file, sys.stdout)
+        else:
+            interact(knowledge_base)
+    finally:
+        if args.stats is not None:
+            knowledge_base.stats.write(args.stats)
 
-    for item in pre_knowledge:
-        knowledge_base.add(item)
 
+def interact(knowledge_base):
     while True:
         line = input()
 
-        if line.startswith('rule '):
-            process_rule_line(knowledge_base, line[5:])
-        elif line.startswith('fact '):
-            process_fact_line(knowledge_base, line[5:])
-        elif line.startswith('query '):
-            process_query_line(knowledge_base, line[6:])
-        elif line.startswith('quit'):
-            break
-        else:
-            print('Invalid input. It may be a fact, rule or query.')
+        try:
+            if line.startswith('rule '):
+                process_rule_line(knowledge_base, line[5:])
+            elif line.startswith('fact '):
+                process_fact_line(knowledge_base, line[5:])
+            elif line.startswith('query '):
+                process_query_line(knowledge_base, line[6:])
+            elif line.startswith('prove '):
+                process_prove_line(knowledge_base, line[6:])
+            elif line.startswith('retract '):
+                process_retract_line(knowledge_base, line[8:])
+            elif line.startswith('explain '):
+                process_explain_line(knowledge_base, line[8:])
+            elif line.startswith('quit'):
+                break
+            else:
+                print('Invalid input. It may be a fact, rule or query.')
+        except ParseError as error:
+            print('Invalid input: ' + error.message)
+
+
+# Reuses the saturated knowledge base of an earlier run unless the data files changed
+def open_knowledge_base(stats=False):
+    try:
+        knowledge_base = KnowledgeBase.open(SNAPSHOT, SOURCES)
+        if stats:
+            knowledge_base.enable_stats()
+        return knowledge_base
+    except (OSError, ValueError):
+        knowledge_base = KnowledgeBase()
+        if stats:
+            knowledge_base.enable_stats()
+        knowledge_base.load(read_facts(FACTS), read_rules(RULES))
+        knowledge_base.save(SNAPSHOT, SOURCES)
+        return knowledge_base
 
 
 def process_rule_line(knowledge_base, line):
@@ -44,5 +100,42 @@ def process_query_line(knowledge_base, line):
         print('False')
 
 
+def process_prove_line(knowledge_base, line):
+    fact = parse_fact_line(line)
+    found = False
+
+    for binding in knowledge_base.prove(fact):
+        found = True
+        print('True: ' + str(binding))
+
+    if not found:
+        print('False')
+
+
+def process_retract_line(knowledge_base, line):
+    if '->' in line:
+        item = parse_rule_line(line)
+    else:
+        item = parse_fact_line(line)
+
+    if not knowledge_base.retract(item):
+        print('Not asserted: ' + line.strip())
+
+
+def process_explain_line(knowledge_base, line):
+    graph = knowledge_base.explain(parse_fact_line(line))
+
+    if not graph:
+        print('False')
+        return
+
+    for fact, reasons in graph.items():
+        for rule, supports in reasons:
+            if supports:
+                print(fact + ' <- ' + ' & '.join(supports) + ' [' + rule + ']')
+            else:
+                print(fact + ' <- ' + rule)
+
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,40 +1,113 @@
+import re
+from itertools import chain
+
 from knowledgebase import *
 
-def parse_input_files():
-    facts, rules = parse_fact_file(), parse_rule_file()
-    output = []
-    for f in facts:
-        output.append(f)
-    for r in rules:
-        output.append(r)
-    return output
+FACTS = 'data/facts'
+RULES = 'data/rules'
+
+# A statement is one line: a fact is a predicate name followed by its terms, a rule is
+# one or more such atoms joined by '&', then '->' and the atom it concludes. Names may
+# contain '-' but not '->' or '&', and the operators need no spaces around them.
+TOKEN = re.compile(r'->|&|(?:[^\s&-]|-(?!>))+')
+
+
+class ParseError(ValueError):
+    def __init__(self, message, line_number=None, path=None):
+        self.message = message
+        self.line_number = line_number
+        self.path = path
+        location = ''
+        if line_number is not None:
+            location = (path or '<input>') + ':' + str(line_number) + ': '
+        super(ParseError, self).__init__(location + message)
+
+
+# Parses a statement in a single pass over its tokens, interning names as it goes.
+# Returns ('fact', atom) or ('rule', (body atoms, head atom)), atoms being the symbol
+# tuples facts and rules are keyed by (see symbols.py), or None for a blank line.
+def parse_statement(text):
+    # Most lines of a fact dump hold no operator at all and are split in one go
+    if '&' not in text and '->' not in text:
+        names = text.split()
+        return ('fact', symbols.atom(names)) if names else None
+
+    intern = symbols.intern
+    body, atom, arrow = [], [], False
+    for token in TOKEN.findall(text):
+        if token == '&' or token == '->':
+            if not atom:
+                raise ParseError("Missing atom before '" + token + "'")
+            if arrow:
+                raise ParseError("Unexpected '" + token + "' after '->'")
+            body.append(tuple(atom))
+            atom = []
+            arrow = token == '->'
+        else:
+            atom.append(intern(token))
+
+    if not atom:
+        raise ParseError("Missing atom after '->'")
+    if arrow:
+        return 'rule', (tuple(body), tuple(atom))
+    raise ParseError("Expected '->' after the atoms joined by '&'")
 
-def parse_fact_file():
-    with open('data/facts', 'r') as file:
-        return [parse_fact_line(line) for line in file]
+def _parse(text, kind):
+    parsed = parse_statement(text)
+    if parsed is None:
+        raise ParseError("Empty statement")
+    if parsed[0] != kind:
+        raise ParseError("Expected a " + kind + ", not a " + parsed[0])
+    return parsed[1]
+
+# Lazily parses a file, given by path, or any iterable of lines, one statement per
+# non-blank line. Yields (kind, key) pairs as parse_statement, only of the given kind if
+# one is given; errors carry the line number.
+def read_statements(source, kind=None):
+    if isinstance(source, str):
+        with open(source) as file:
+            yield from read_statements(file, kind)
+        return
+
+    path = getattr(source, 'name', None)
+    line_number = 0
+    try:
+        for line_number, line in enumerate(source, 1):
+            parsed = parse_statement(line)
+            if parsed is None:
+                continue
+            if kind is not None and parsed[0] != kind:
+                raise ParseError("Expected a " + kind + ", not a " + parsed[0])
+            yield parsed
+    except ParseError as error:
+        raise ParseError(error.message, line_number, path) from None
+
+def read_facts(source=FACTS):
+    from_key = Fact.from_key
+    for _, key in read_statements(source, 'fact'):
+        yield from_key(key)
+
+def read_rules(source=RULES):
+    from_key = Rule.from_key
+    for _, key in read_statements(source, 'rule'):
+        yield from_key(key)
+
+
+def parse_input_files(facts=FACTS, rules=RULES):
+    return chain(read_facts(facts), read_rules(rules))
+
+def parse_fact_file(path=FACTS):
+    return list(read_facts(path))
 
 def parse_fact_line(fact):
-    return Fact(fact.rstrip().strip().split())
-
-def parse_rule_file():
-    with open('data/rules', 'r') as file:
-        lines = [line.rstrip() for line in file]
-        rules = []
-        for line in lines:
-            r = line.split('->')
-            rhs = r[1].rstrip().strip().split()
-            lhs = r[0].split('&')
-            lhs = map(lambda x: x.rstrip().strip().split(), lhs)
-            rules.append(parse_rule(lhs, rhs))
-        return rules
+    return Fact.from_key(_parse(fact, 'fact'))
+
+def parse_rule_file(path=RULES):
+    return list(read_rules(path))
 
 def parse_rule_line(line):
-    r = line.split('->')
-    rhs = r[1].rstrip().strip().split()
-    lhs = r[0].split('&')
-    lhs = map(lambda x: x.rstrip().strip().split(), lhs)
-    return parse_rule(lhs, rhs)
+    return Rule.from_key(_parse(line, 'rule'))
 
 
 def parse_rule(lhs, rhs):
-    return Rule([[list(map(lambda x: x.strip(), c)) for c in lhs], rhs])
\ No newline at end of file
+    return Rule([[list(map(lambda x: x.strip(), c)) for c in lhs], rhs])
@@ -0,0 +1,221 @@
+import time
+
+from symbols import is_variable_symbol
+
+
+# Alpha memories hold the facts that pass the constant tests of a single antecedent.
+# The pattern has one entry per term: ('c', value) for a constant, ('=', position) when
+# the term repeats a variable seen earlier in the same antecedent, None otherwise.
+class AlphaMemory:
+    def __init__(self, pattern):
+        self.pattern = pattern
+        self.facts = []
+        self.indexes = {}
+        self.successors = []
+
+    def accepts(self, key):
+        for position, test in enumerate(self.pattern, 1):
+            if test is None:
+                continue
+            if test[0] == 'c':
+                if key[position] != test[1]:
+                    return False
+            elif key[position] != key[test[1]]:
+                return False
+        return True
+
+    def store(self, fact):
+        self.facts.append(fact)
+        key = fact.key
+        for positions, index in self.indexes.items():
+            index.setdefault(tuple(key[p] for p in positions), []).append(fact)
+
+    def index(self, positions):
+        if positions not in self.indexes:
+            index = {}
+            for fact in self.facts:
+                index.setdefault(tuple(fact.key[p] for p in positions), []).append(fact)
+            self.indexes[positions] = index
+        return self.indexes[positions]
+
+
+# A beta node joins the tokens of its parent with the facts of one alpha memory and keeps
+# the resulting tokens. A token is a pair of (variable values, matched facts); variables
+# are numbered by first occurrence so rules sharing a prefix share the same nodes.
+class BetaNode:
+    def __init__(self, parent=None, alpha=None, checks=(), binds=()):
+        self.parent = parent
+        self.alpha = alpha
+        self.positions = tuple(position for position, _ in checks)
+        self.slots = tuple(slot for _, slot in checks)
+        self.binds = binds
+        self.tokens = []
+        self.indexes = {}
+        self.children = {}
+        self.productions = []
+        # Rules whose antecedents are joined here, which share the work for statistics
+        self.rules = []
+
+    def index(self, slots):
+        if slots not in self.indexes:
+            index = {}
+            for token in self.tokens:
+                index.setdefault(tuple(token[0][s] for s in slots), []).append(token)
+            self.indexes[slots] = index
+        return self.indexes[slots]
+
+    def child(self, alpha, checks, binds):
+        signature = (id(alpha), checks, binds)
+        node = self.children.get(signature)
+        if node is None:
+            node = BetaNode(self, alpha, checks, binds)
+            for token in self.tokens:
+                node.left_activate(token, [])
+            # Descendants go first so a fact matching several antecedents of one rule
+            # is not joined with itself twice
+            alpha.successors.insert(0, node)
+            self.children[signature] = node
+        return node
+
+    def right_activate(self, fact, activations):
+        key = fact.key
+        probe = tuple(key[p] for p in self.positions)
+        for values, facts in self.parent.index(self.slots).get(probe, ()):
+            self.activate((values + tuple(key[p] for p in self.binds), facts + (fact,)), activations)
+
+    def left_activate(self, token, activations):
+        values, facts = token
+        probe = tuple(values[s] for s in self.slots)
+        for fact in self.alpha.index(self.positions).get(probe, ()):
+            key = fact.key
+            self.activate((values + tuple(key[p] for p in self.binds), facts + (fact,)), activations)
+
+    def activate(self, token, activations):
+        self.tokens.append(token)
+        for slots, index in self.indexes.items():
+            index.setdefault(tuple(token[0][s] for s in slots), []).append(token)
+        for production in self.productions:
+            activations.append(production.fire(token))
+        for child in self.children.values():
+            child.left_activate(token, activations)
+
+
+class Production:
+    def __init__(self, rule, template):
+        self.rule = rule
+        self.template = template
+
+    def fire(self, token):
+        values, facts = token
+        key = (self.template[0],) + tuple(values[t[1]] if t[0] == 's' else t[1] for t in self.template[1:])
+        return self.rule, key, facts
+
+
+class ReteNetwork:
+    def __init__(self):
+        self.root = BetaNode()
+        self.root.activate(((), ()), [])
+        self.alpha_memories = {}
+        self.alpha_by_signature = {}
+        self.facts_by_signature = {}
+
+    # With `joins`, a list, every join the fact goes into is appended to it as a (node,
+    # matches, seconds) triple, the time including the joins further down
+    def add_fact(self, fact, joins=None):
+        activations = []
+        key = fact.key
+        signature = (key[0], len(key) - 1)
+        self.facts_by_signature.setdefault(signature, {})[key] = fact
+        for alpha in self.alpha_by_signature.get(signature, ()):
+            if alpha.accepts(key):
+                alpha.store(fact)
+                for node in alpha.successors:
+                    if joins is None:
+                        node.right_activate(fact, activations)
+                    else:
+                        started = time.perf_counter()
+                        node.right_activate(fact, activations)
+                        joins.append((node, 1, time.perf_counter() - started))
+        return activations
+
+    # With `joins`, every node the rule adds is appended with the partial matches it
+    # built, as in add_fact
+    def add_rule(self, rule, joins=None):
+        lhs, rhs = rule.key
+        slots = {}
+        node = self.root
+        for key in lhs:
+            pattern, checks, binds, local = [], [], [], {}
+            for position, element in enumerate(key[1:], 1):
+                if not is_variable_symbol(element):
+                    pattern.append(('c', element))
+                elif element in local:
+                    pattern.append(('=', local[element]))
+                else:
+                    local[element] = position
+                    pattern.append(None)
+                    if element in slots:
+                        checks.append((position, slots[element]))
+                    else:
+                        slots[element] = len(slots)
+                        binds.append(position)
+            alpha = self._alpha_memory(key[0], tuple(pattern))
+            parent, children = node, len(node.children)
+            started = time.perf_counter()
+            node = node.child(alpha, tuple(checks), tuple(binds))
+            node.rules.append(rule)
+            if joins is not None and len(parent.children) > children:
+                joins.append((node, len(node.tokens), time.perf_counter() - started))
+
+        template = (rhs[0],) + tuple(('s', slots[e]) if e in slots else ('c', e) for e in rhs[1:])
+        production = Production(rule, template)
+        node.productions.append(production)
+        return [production.fire(token) for token in node.tokens]
+
+    # Drops retracted facts from the memories and every token built from them, and the
+    # productions of retracted rules. Indexes of the touched memories are rebuilt lazily.
+    def remove(self, facts, rules):
+        removed = {id(fact) for fact in facts}
+        touched = {}
+        for fact in facts:
+            key = fact.key
+            signature = (key[0], len(key) - 1)
+            self.facts_by_signature.get(signature, {}).pop(key, None)
+            for alpha in self.alpha_by_signature.get(signature, ()):
+                if alpha.accepts(key):
+                    touched[id(alpha)] = alpha
+
+        nodes = {}
+        for alpha in touched.values():
+            alpha.facts = [f for f in alpha.facts if id(f) not in removed]
+            alpha.indexes = {}
+            pending = list(alpha.successors)
+            while pending:
+                node = pending.pop()
+                if id(node) not in nodes:
+                    nodes[id(node)] = node
+                    pending.extend(node.children.values())
+        for node in nodes.values():
+            node.tokens = [t for t in node.tokens if not any(id(f) in removed for f in t[1])]
+            node.indexes = {}
+
+        if rules:
+            retracted = {id(rule) for rule in rules}
+            pending = [self.root]
+            while pending:
+                node = pending.pop()
+                node.productions = [p for p in node.productions if id(p.rule) not in retracted]
+                node.rules = [r for r in node.rules if id(r) not in retracted]
+                pending.extend(node.children.values())
+
+    def _alpha_memory(self, name, pattern):
+        alpha = self.alpha_memories.get((name, pattern))
+        if alpha is None:
+            alpha = AlphaMemory(pattern)
+            signature = (name, len(pattern))
+            for fact in self.facts_by_signature.get(signature, {}).values():
+                if alpha.accepts(fact.key):
+                    alpha.store(fact)
+            self.alpha_memories[(name, pattern)] = alpha
+            self.alpha_by_signature.setdefault(signature, []).append(alpha)
+        return alpha
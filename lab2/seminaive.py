@@ -0,0 +1,91 @@
+import time
+
+from knowledgebase import DerivationLimitExceeded, Relation, lookup_relation, match_key, instantiate_key
+
+
+# Joins the antecedents listed in `order`, skipping rows that belong to `excluded`
+# for the antecedents in `old` (those must come from facts known before this round).
+# `matches`, a one-item list or None, counts the rows looked at.
+def _join(relations, lhs, order, bindings, body, old, excluded, matches=None):
+    if not order:
+        yield bindings, tuple(body)
+        return
+    i = order[0]
+    rows = lookup_relation(relations, lhs[i], bindings)
+    if matches is not None:
+        matches[0] += len(rows)
+    for key in rows:
+        if i in old and key in excluded:
+            continue
+        extended = match_key(lhs[i], key, bindings)
+        if extended is not None:
+            body[i] = key
+            yield from _join(relations, lhs, order[1:], extended, body, old, excluded, matches)
+
+
+def _derivations(relations, rule, delta, matches=None):
+    lhs, rhs = rule.key
+    if delta is None:
+        for bindings, body in _join(relations, lhs, list(range(len(lhs))), {}, [None] * len(lhs), (), (), matches):
+            yield instantiate_key(rhs, bindings), body
+        return
+
+    facts, excluded = delta
+    # Every derivation is produced once: antecedent i is the first one matched by a new fact
+    for i, pattern in enumerate(lhs):
+        old = set(range(i))
+        rest = [j for j in range(len(lhs)) if j != i]
+        rows = facts.get((pattern[0], len(pattern) - 1), ())
+        if matches is not None:
+            matches[0] += len(rows)
+        for key in rows:
+            bindings = match_key(pattern, key, {})
+            if bindings is None:
+                continue
+            body = [None] * len(lhs)
+            body[i] = key
+            for extended, derived_body in _join(relations, lhs, rest, bindings, body, old, excluded, matches):
+                yield instantiate_key(rhs, extended), derived_body
+
+
+# Semi-naive bottom-up evaluation: each round joins only the facts derived in the
+# previous round against the full relations. `relations` must already hold `delta`.
+# Rules in `new_rules` have not seen any fact yet and are evaluated in full once. Raises
+# DerivationLimitExceeded past `limit` derivations, leaving the relations half extended.
+# The rows every rule looks at and the time spent joining it go to `stats` if given.
+def saturate(relations, rules, delta, is_known, new_rules=(), limit=None, stats=None):
+    derivations = []
+    derived = set()
+    active = list(rules)
+    fresh = list(new_rules)
+    while delta or fresh:
+        by_signature = {}
+        for key in delta:
+            by_signature.setdefault((key[0], len(key) - 1), []).append(key)
+        current = (by_signature, set(delta))
+
+        next_delta = []
+        plans = [(rule, None) for rule in fresh] + [(rule, current) for rule in active]
+        for rule, rule_delta in plans:
+            matches = None if stats is None else [0]
+            started = time.perf_counter()
+            for head, body in _derivations(relations, rule, rule_delta, matches):
+                derivations.append((rule, head, body))
+                if limit is not None and len(derivations) > limit:
+                    raise DerivationLimitExceeded(
+                        "Loading derived more than " + str(limit) + " facts")
+                if head not in derived and not is_known(head):
+                    derived.add(head)
+                    next_delta.append(head)
+            if stats is not None:
+                rule_stats = stats.rule(rule)
+                rule_stats.matches += matches[0]
+                rule_stats.seconds += time.perf_counter() - started
+
+        for key in next_delta:
+            relations.setdefault((key[0], len(key) - 1), Relation()).add(key)
+        active += fresh
+        fresh = []
+        delta = next_delta
+
+    return derivations
@@ -0,0 +1,138 @@
+import asyncio
+import json
+
+from reader import parse_fact_line, parse_rule_line
+
+COMMANDS = ('fact', 'rule', 'query', 'prove', 'retract', 'explain')
+ASSERTS = ('fact', 'rule')
+
+
+# Turns command lines, str or utf-8 bytes, into (command, argument text, parsed item)
+# triples. Blank lines are skipped, quit comes out last and lines that cannot be decoded
+# or parsed come out as ('error', message, line).
+def parse_commands(lines):
+    for line in lines:
+        if isinstance(line, bytes):
+            try:
+                line = line.decode('utf-8')
+            except UnicodeDecodeError:
+                yield 'error', 'Invalid UTF-8 input', line.decode('utf-8', 'replace').strip()
+                continue
+        line = line.strip()
+        if not line:
+            continue
+        command, _, text = line.partition(' ')
+        if command == 'quit':
+            yield 'quit', text, None
+            return
+        if command not in COMMANDS:
+            yield 'error', 'Invalid input. It may be a fact, rule or query.', line
+        elif not text.split():
+            yield 'error', 'Missing statement after ' + command, line
+        else:
+            try:
+                if command == 'rule' or (command == 'retract' and '->' in text):
+                    yield command, text, parse_rule_line(text)
+                else:
+                    yield command, text, parse_fact_line(text)
+            except (IndexError, ValueError):
+                yield 'error', 'Could not parse: ' + text, line
+
+
+# Collapses every run of consecutive facts and rules into a single ('load', facts, rules)
+# step so they are saturated together instead of one add at a time
+def group_asserts(commands):
+    facts, rules = [], []
+    for command in commands:
+        if command[0] in ASSERTS:
+            (facts if command[0] == 'fact' else rules).append(command[2])
+            continue
+        if facts or rules:
+            yield 'load', facts, rules
+            facts, rules = [], []
+        yield command
+    if facts or rules:
+        yield 'load', facts, rules
+
+
+# Runs the commands and yields a JSON-ready result for each. A command that fails gives
+# an error result and the ones after it still run. Quit gives a {'command': 'quit'}
+# result, which is not an answer but tells the caller to stop.
+def execute(knowledge_base, commands):
+    for command, text, item in commands:
+        if command == 'quit':
+            yield {'command': 'quit'}
+            return
+        try:
+            yield run_command(knowledge_base, command, text, item)
+        except Exception as error:
+            source = command if command == 'load' else command + ' ' + text
+            yield {'command': 'error', 'error': type(error).__name__ + ': ' + str(error), 'input': source}
+
+
+def run_command(knowledge_base, command, text, item):
+    if command == 'load':
+        knowledge_base.load(text, item)
+        return {'command': 'load', 'facts': len(text), 'rules': len(item)}
+    elif command in ('query', 'prove'):
+        bindings = knowledge_base.query(item) if command == 'query' else knowledge_base.prove(item)
+        answers = [dict(binding.mapping) for binding in bindings]
+        return {'command': command, 'input': text, 'result': bool(answers), 'answers': answers}
+    elif command == 'retract':
+        return {'command': command, 'input': text, 'result': knowledge_base.retract(item)}
+    elif command == 'explain':
+        graph = knowledge_base.explain(item)
+        return {'command': command, 'input': text, 'result': bool(graph), 'explanation': graph or {}}
+    else:
+        return {'command': 'error', 'error': text, 'input': item}
+
+
+def process_lines(knowledge_base, lines):
+    return execute(knowledge_base, group_asserts(parse_commands(lines)))
+
+
+def run_batch(knowledge_base, lines, output):
+    for result in process_lines(knowledge_base, lines):
+        if result['command'] == 'quit':
+            break
+        output.write(json.dumps(result) + '\n')
+        output.flush()
+
+
+# Writes the results of lines to a client, returns False once it sent quit
+def _answer(knowledge_base, lines, writer):
+    for result in process_lines(knowledge_base, lines):
+        if result['command'] == 'quit':
+            return False
+        writer.write(json.dumps(result).encode('utf-8') + b'\n')
+    return True
+
+
+# Every client reads whatever lines have arrived and runs them as one batch. Batches
+# run on the event loop without awaiting in between, so clients share one knowledge
+# base without seeing each other's half-applied commands. Quit closes the connection.
+async def handle_client(knowledge_base, reader, writer):
+    pending = b''
+    try:
+        while True:
+            data = await reader.read(65536)
+            if not data:
+                _answer(knowledge_base, [pending], writer)
+                break
+            lines = (pending + data).split(b'\n')
+            pending = lines.pop()
+            if not _answer(knowledge_base, lines, writer):
+                break
+            await writer.drain()
+        await writer.drain()
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+
+
+async def serve(knowledge_base, host='127.0.0.1', port=7878):
+    server = await asyncio.start_server(
+        lambda reader, writer: handle_client(knowledge_base, reader, writer), host, port)
+    async with server:
+        await server.serve_forever()
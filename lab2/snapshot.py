@@ -0,0 +1,272 @@
+import hashlib
+import mmap
+import os
+import struct
+import sys
+from array import array
+
+from knowledgebase import Fact, Rule
+from symbols import symbols
+
+# Layout, little endian:
+#   header     magic, sources fingerprint and stamp, section counts and offsets
+#   symbols    u32 offsets into a utf-8 blob, one entry per symbol used by the snapshot
+#   rules      i32 stream: lhs count, then (length, symbols...) per atom, rhs atom last
+#   tables     one directory entry per (predicate, arity) followed by the i32 rows and
+#              the asserted bitmap of every table; facts are numbered table by table
+#   support    u32 start of each fact's justifications, then an i32 stream of
+#              (rule, support count, fact ids...) entries
+MAGIC = b'KBSNAP\x00\x02'
+HEADER = struct.Struct('<8s32s32s4I4Q')
+TABLE = struct.Struct('<4I2Q')
+
+
+class StaleSnapshotError(ValueError):
+    pass
+
+
+def fingerprint(sources):
+    digest = hashlib.sha256()
+    for path in sources:
+        with open(path, 'rb') as file:
+            digest.update(hashlib.sha256(file.read()).digest())
+    return digest.digest()
+
+# Sizes and modification times of the sources. While they match the ones recorded in a
+# snapshot the sources are taken to be unchanged and are not hashed again.
+def stamp(sources):
+    digest = hashlib.sha256()
+    for path in sources:
+        status = os.stat(path)
+        digest.update(struct.pack('<2q', status.st_size, status.st_mtime_ns))
+    return digest.digest()
+
+
+def _ints(values, typecode='i'):
+    values = array(typecode, values)
+    if sys.byteorder != 'little':
+        values.byteswap()
+    return values.tobytes()
+
+
+def _read_ints(buffer, start, count, typecode='i'):
+    values = array(typecode)
+    values.frombytes(buffer[start:start + count * values.itemsize])
+    if sys.byteorder != 'little':
+        values.byteswap()
+    return values
+
+
+def write_snapshot(path, facts, rules, justifications, sources=()):
+    local = {}
+    names = []
+
+    def symbol(global_id):
+        if global_id not in local:
+            local[global_id] = len(names)
+            names.append(symbols.name(global_id).encode('utf-8'))
+        return local[global_id]
+
+    rule_stream = []
+    for rule in rules:
+        lhs, rhs = rule.key
+        rule_stream.append(len(lhs))
+        for atom in list(lhs) + [rhs]:
+            rule_stream.append(len(atom))
+            rule_stream.extend(symbol(s) for s in atom)
+
+    tables = {}
+    for fact in facts:
+        tables.setdefault((fact.key[0], len(fact.key) - 1), []).append(fact)
+
+    ordered = []
+    directory, table_data = [], []
+    for (predicate, arity), table in tables.items():
+        rows, bits = [], bytearray((len(table) + 7) // 8)
+        for n, fact in enumerate(table):
+            rows.extend(symbol(s) for s in fact.key[1:])
+            if fact.asserted:
+                bits[n // 8] |= 1 << (n % 8)
+        directory.append([symbol(predicate), arity, len(table), len(ordered)])
+        table_data.append((_ints(rows), bytes(bits)))
+        ordered += table
+
+    fact_ids = {id(fact): n for n, fact in enumerate(ordered)}
+    rule_ids = {id(rule): n for n, rule in enumerate(rules)}
+    starts, stream = [], []
+    for fact in ordered:
+        starts.append(len(stream))
+        for rule, supports in justifications(fact):
+            stream.extend([rule_ids[id(rule)], len(supports)] + [fact_ids[id(s)] for s in supports])
+    starts.append(len(stream))
+
+    blob_offsets, blob = [0], b''.join(names)
+    for name in names:
+        blob_offsets.append(blob_offsets[-1] + len(name))
+
+    symbols_offset = HEADER.size
+    symbols_section = _ints(blob_offsets, 'I') + blob
+    rules_offset = symbols_offset + len(symbols_section)
+    rules_offset += -rules_offset % 4
+    rules_section = _ints([len(rule_stream)], 'I') + _ints(rule_stream)
+    tables_offset = rules_offset + len(rules_section)
+
+    data_offset = tables_offset + TABLE.size * len(directory)
+    tables_section = []
+    for entry, (rows, bits) in zip(directory, table_data):
+        rows_offset = data_offset
+        bits_offset = rows_offset + len(rows)
+        data_offset = bits_offset + len(bits) + (-(bits_offset + len(bits)) % 4)
+        tables_section.append(TABLE.pack(*(entry + [rows_offset, bits_offset])))
+    for rows, bits in table_data:
+        tables_section.append(rows + bits + b'\0' * (-len(bits) % 4))
+    support_offset = data_offset
+
+    # Stamped first, so that a source changed while it is hashed looks changed when opened
+    sources_stamp = stamp(sources)
+    header = HEADER.pack(MAGIC, fingerprint(sources), sources_stamp, len(names), len(rules), len(directory),
+                         len(fact_ids), symbols_offset, rules_offset, tables_offset, support_offset)
+
+    temporary = path + '.tmp'
+    with open(temporary, 'wb') as file:
+        file.write(header)
+        file.write(symbols_section)
+        file.write(b'\0' * (rules_offset - symbols_offset - len(symbols_section)))
+        file.write(rules_section)
+        for chunk in tables_section:
+            file.write(chunk)
+        file.write(_ints(starts, 'I'))
+        file.write(_ints(stream))
+    os.replace(temporary, path)
+
+
+# Reads a snapshot through a memory map. Symbols are interned and tables decoded only
+# when they are first asked for. The layout is checked against the size of the file when
+# it is opened, and a file that does not fit raises ValueError.
+class SnapshotReader:
+    def __init__(self, path, sources=()):
+        self.path = path
+        self.file = open(path, 'rb')
+        try:
+            self.buffer = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self.file.close()
+            raise ValueError("Not a knowledge base snapshot: " + path)
+        try:
+            self._read_layout(sources)
+        except ValueError:
+            self.close()
+            raise
+
+    def _check(self, condition):
+        if not condition:
+            raise ValueError("Corrupt knowledge base snapshot: " + self.path)
+
+    def _read_layout(self, sources):
+        size = len(self.buffer)
+        if size < HEADER.size or self.buffer[:len(MAGIC)] != MAGIC:
+            raise ValueError("Not a knowledge base snapshot: " + self.path)
+        (_, digest, sources_stamp, self.symbol_count, rule_count, table_count, self.fact_count,
+         self.symbols_offset, rules_offset, tables_offset, self.support_offset) = HEADER.unpack_from(self.buffer)
+        if sources_stamp != stamp(sources) and digest != fingerprint(sources):
+            raise StaleSnapshotError("Snapshot " + self.path + " was built from different source files")
+
+        check = self._check
+        blob = self.symbols_offset + 4 * (self.symbol_count + 1)
+        check(HEADER.size <= self.symbols_offset and blob <= rules_offset
+              and rules_offset + 4 <= tables_offset <= self.support_offset
+              and self.support_offset + 4 * (self.fact_count + 1) <= size)
+
+        self.blob_offsets = _read_ints(self.buffer, self.symbols_offset, self.symbol_count + 1, 'I')
+        check(blob + self.blob_offsets[-1] <= rules_offset)
+        self.globals = [None] * self.symbol_count
+
+        length = _read_ints(self.buffer, rules_offset, 1, 'I')[0]
+        check(rules_offset + 4 * (length + 1) <= tables_offset)
+        self.rule_stream = _read_ints(self.buffer, rules_offset + 4, length)
+        self.rule_count = rule_count
+
+        check(tables_offset + TABLE.size * table_count <= self.support_offset)
+        self.tables = {}
+        for n in range(table_count):
+            predicate, arity, rows, first, rows_offset, bits_offset = \
+                TABLE.unpack_from(self.buffer, tables_offset + n * TABLE.size)
+            check(predicate < self.symbol_count and first + rows <= self.fact_count
+                  and rows_offset + 4 * rows * arity <= bits_offset
+                  and bits_offset + (rows + 7) // 8 <= self.support_offset)
+            self.tables[(self.symbol(predicate), arity)] = (rows, first, rows_offset, bits_offset)
+        # Every fact belongs to exactly one table
+        ranges = sorted((first, rows) for rows, first, _, _ in self.tables.values())
+        check(len(ranges) == table_count
+              and all(first == (ranges[n - 1][0] + ranges[n - 1][1] if n else 0)
+                      for n, (first, _) in enumerate(ranges))
+              and sum(rows for _, rows in ranges) == self.fact_count)
+
+        supports = _read_ints(self.buffer, self.support_offset + 4 * self.fact_count, 1, 'I')[0]
+        check(self.support_offset + 4 * (self.fact_count + 1 + supports) == size)
+        self.facts = [None] * self.fact_count
+        self.loaded_rules = []
+
+    def close(self):
+        self.buffer.close()
+        self.file.close()
+
+    def symbol(self, local):
+        if self.globals[local] is None:
+            blob = self.symbols_offset + 4 * (self.symbol_count + 1)
+            name = self.buffer[blob + self.blob_offsets[local]:blob + self.blob_offsets[local + 1]]
+            self._check(name)
+            self.globals[local] = symbols.intern(name.decode('utf-8'))
+        return self.globals[local]
+
+    def rules(self):
+        stream, position, rules = self.rule_stream, 0, []
+        try:
+            while position < len(stream):
+                atoms = []
+                for _ in range(stream[position] + 1):
+                    length = stream[position + 1]
+                    atoms.append(tuple(self.symbol(s) for s in stream[position + 2:position + 2 + length]))
+                    position += length + 1
+                position += 1
+                rules.append(Rule.from_key((tuple(atoms[:-1]), atoms[-1])))
+        except IndexError:
+            self._check(False)
+        self._check(len(rules) == self.rule_count)
+        self.loaded_rules = rules
+        return rules
+
+    def table(self, signature):
+        rows, first, rows_offset, bits_offset = self.tables.pop(signature)
+        arity = signature[1]
+        values = _read_ints(self.buffer, rows_offset, rows * arity)
+        bits = self.buffer[bits_offset:bits_offset + (rows + 7) // 8]
+        symbol = self.symbol
+        facts = []
+        try:
+            for n in range(rows):
+                key = (signature[0],) + tuple([symbol(s) for s in values[n * arity:(n + 1) * arity]])
+                fact = Fact.from_key(key)
+                fact.asserted = bool(bits[n // 8] & (1 << (n % 8)))
+                self.facts[first + n] = fact
+                facts.append(fact)
+        except IndexError:
+            self._check(False)
+        return facts
+
+    # Only valid once the rules and every table have been read
+    def justifications(self):
+        rules = self.loaded_rules
+        starts = _read_ints(self.buffer, self.support_offset, self.fact_count + 1, 'I')
+        stream = _read_ints(self.buffer, self.support_offset + 4 * (self.fact_count + 1), starts[-1])
+        for fact, start, end in zip(self.facts, starts, starts[1:]):
+            position = start
+            while position < end:
+                try:
+                    count = stream[position + 1]
+                    supports = [self.facts[i] for i in stream[position + 2:position + 2 + count]]
+                    justification = [rules[stream[position]]] + supports
+                except IndexError:
+                    self._check(False)
+                yield fact, justification
+                position += count + 2
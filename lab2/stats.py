@@ -0,0 +1,94 @@
+import json
+
+# Opt-in instrumentation of a knowledge base, see KnowledgeBase.enable_stats. Rules are
+# counted under the asserted rule they come from, so the partial rules of the
+# incremental engine add up to the rule that was written. For every rule:
+#
+#   matches        facts matched against its antecedents: against the first one by the
+#                  incremental engine, one per fact entering one of its joins or partial
+#                  match built by a new join in the rete engine, and the rows each join
+#                  looked at in bulk loads
+#   fires          facts it derived, already known ones included
+#   partial_rules  partial rules it derived
+#   redundant      derivations of facts or partial rules that were already known
+#   seconds        time spent matching it and building what it derived; the rete engine
+#                  counts joins shared by several rules for each of them
+#
+# Derivation depth is the longest chain of rule applications behind a fact when it is
+# first derived, asserted facts being at depth 0.
+
+
+class RuleStats:
+    __slots__ = ('matches', 'fires', 'partial_rules', 'redundant', 'seconds')
+
+    def __init__(self):
+        self.matches = 0
+        self.fires = 0
+        self.partial_rules = 0
+        self.redundant = 0
+        self.seconds = 0.0
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class InferenceStats:
+    def __init__(self, growth_interval=1):
+        self.rules = {}
+        self.operations = {}
+        self.depth_histogram = {}
+        # Size of the knowledge base after every growth_interval-th operation
+        self.growth = []
+        self.growth_interval = growth_interval
+        self.operation_count = 0
+        # Depths of the derived facts and partial rules, by key
+        self._depths = {}
+        # Set while an operation is timed, so that nested ones are not counted twice
+        self.active = False
+
+    def rule(self, rule):
+        stats = self.rules.get(rule.key)
+        if stats is None:
+            stats = self.rules[rule.key] = RuleStats()
+        return stats
+
+    def operation(self, name, seconds, facts, rules):
+        calls = self.operations.get(name)
+        if calls is None:
+            calls = self.operations[name] = {'calls': 0, 'seconds': 0.0}
+        calls['calls'] += 1
+        calls['seconds'] += seconds
+
+        self.operation_count += 1
+        if self.operation_count % self.growth_interval == 0:
+            self.growth.append({'operation': self.operation_count, 'facts': facts, 'rules': rules})
+
+    # Records the depth of a newly stored fact or partial rule from its first justification
+    def derived(self, item, is_fact):
+        if not item.relies_on:
+            return
+        depths = self._depths
+        depth = max(depths.get(support.key, 0) for support in item.relies_on[0])
+        if is_fact:
+            depth += 1
+            self.depth_histogram[depth] = self.depth_histogram.get(depth, 0) + 1
+        if depth:
+            depths[item.key] = depth
+
+    def to_dict(self):
+        from knowledgebase import Rule
+
+        return {
+            'operations': self.operations,
+            'rules': {str(Rule.from_key(key)): stats.to_dict() for key, stats in self.rules.items()},
+            'depth_histogram': {str(depth): count for depth, count in sorted(self.depth_histogram.items())},
+            'growth': self.growth,
+        }
+
+    def to_json(self, indent=None):
+        return json.dumps(self.to_dict(), indent=indent)
+
+    def write(self, path):
+        with open(path, 'w') as file:
+            file.write(self.to_json(indent=2))
+            file.write('\n')
@@ -0,0 +1,42 @@
+# Every predicate name, constant and variable is interned once and referred to by an
+# integer id. Constants get positive ids and variables negative ones, so a ground atom
+# is a plain tuple of ints: (predicate, argument, argument, ...).
+class SymbolTable:
+    __slots__ = ('ids', 'constants', 'variables')
+
+    def __init__(self):
+        self.ids = {}
+        self.constants = [None]
+        self.variables = [None]
+
+    def __len__(self):
+        return len(self.ids)
+
+    def intern(self, name):
+        symbol = self.ids.get(name)
+        if symbol is None:
+            if name[0] == '?':
+                symbol = -len(self.variables)
+                self.variables.append(name)
+            else:
+                symbol = len(self.constants)
+                self.constants.append(name)
+            self.ids[name] = symbol
+        return symbol
+
+    def name(self, symbol):
+        return self.constants[symbol] if symbol > 0 else self.variables[-symbol]
+
+    def atom(self, elements):
+        intern = self.intern
+        return tuple([intern(e) for e in elements])
+
+    def elements(self, atom):
+        return [self.name(symbol) for symbol in atom]
+
+
+symbols = SymbolTable()
+
+
+def is_variable_symbol(symbol):
+    return symbol < 0
@@ -0,0 +1,125 @@
+import argparse
+import random
+import sys
+
+import numpy as np
+
+from ga import GAParams, mutate, run_ga
+from problem import Classroom, Subject, TimetableProblem, load_problem
+from scoring import ConstraintScorer
+
+# Regression checks for the timetable GA, run with `python checks.py [name ...]`. Each
+# check raises AssertionError when it fails.
+
+PROBLEM = 'data/timetable.json'
+
+
+# A seeded island run gives the same timetable whatever the number of worker processes
+def check_islands(seeds=(0, 1)):
+    problem = load_problem(PROBLEM)
+    for seed in seeds:
+        results = []
+        for workers in (1, 2, 4):
+            params = GAParams(population_size=30, generations=40, seed=seed, islands=4, workers=workers,
+                              migration_interval=10)
+            schedule, score = run_ga(problem, params)
+            results.append((schedule.tolist(), score))
+        assert results[1:] == results[:-1], 'seed ' + str(seed) + ': results depend on the number of workers'
+
+    # The seed does matter
+    params = [GAParams(population_size=30, generations=1, seed=seed, islands=2) for seed in seeds]
+    assert not np.array_equal(run_ga(problem, params[0])[0], run_ga(problem, params[1])[0]), 'seed ignored'
+
+
+# Mutation draws subjects only, as the original lab did, and every one of them
+def check_mutation(values=6):
+    population = np.zeros((50, 4, 5), dtype=np.int32)
+    mutate(population, values, GAParams(mutation_rate=1.0), np.random.default_rng(0))
+    assert sorted(set(population.ravel().tolist())) == list(range(1, values)), 'mutation drew ' + \
+        str(sorted(set(population.ravel().tolist())))
+
+
+# The fitness function of the original lab, for its instance: a point per subject held
+# exactly once, minus one per cell whose value, empty rooms included, repeats in its slot
+def original_fitness(schedule, subjects):
+    score = 0
+    for row in range(schedule.shape[0]):
+        for col in range(schedule.shape[1]):
+            if np.count_nonzero(schedule[row] == schedule[row][col]) > 1:
+                score -= 1
+    subject_counts = np.array([np.count_nonzero(schedule == i + 1) for i in range(subjects)])
+    score += np.sum(subject_counts == 1)
+    return score
+
+# The scoring rules of scoring.py, one cell at a time
+def reference_score(problem, schedule):
+    score = 0
+    for row in schedule.tolist():
+        for room, value in enumerate(row):
+            if row.count(value) > 1 and (value or problem.empty_rooms_clash):
+                score -= 1
+            if value:
+                subject = problem.subjects[value - 1]
+                teachers = [problem.subjects[other - 1].teacher for other in row if other]
+                if subject.teacher is not None and teachers.count(subject.teacher) > 1:
+                    score -= 1
+                capacity = problem.classrooms[room].capacity
+                if capacity is not None and subject.students > capacity:
+                    score -= 1
+    for i, subject in enumerate(problem.subjects):
+        score += int(np.count_nonzero(schedule == i + 1) == subject.sessions)
+    return score
+
+def random_problem(rng):
+    subjects = [Subject('S' + str(i), rng.choice([None, 'T1', 'T2', 'T3']), rng.randint(0, 40), rng.randint(1, 3))
+                for i in range(rng.randint(1, 8))]
+    classrooms = [Classroom('R' + str(i), rng.choice([None, 10, 25, 50])) for i in range(rng.randint(1, 4))]
+    slots = max(rng.randint(1, 6), -(-sum(subject.sessions for subject in subjects) // len(classrooms)))
+    return TimetableProblem(subjects, classrooms, range(slots), rng.random() < 0.5)
+
+# Scores of whole populations match the original fitness on the original instance, and
+# the rules written out cell by cell on random instances with teachers and capacities
+def check_scoring(populations=200, size=20):
+    problem = load_problem(PROBLEM)
+    scorer = ConstraintScorer(problem)
+    rng = np.random.default_rng(0)
+    population = rng.integers(0, len(problem.subjects) + 1, size=(populations,) + problem.shape)
+    expected = [original_fitness(schedule, len(problem.subjects)) for schedule in population]
+    assert scorer(population).tolist() == expected, 'scores differ from the original fitness'
+
+    for seed in range(populations):
+        problem = random_problem(random.Random(seed))
+        population = rng.integers(0, len(problem.subjects) + 1, size=(size,) + problem.shape)
+        expected = [reference_score(problem, schedule) for schedule in population]
+        assert ConstraintScorer(problem)(population).tolist() == expected, 'seed ' + str(seed) + ': scores differ'
+
+
+CHECKS = {
+    'islands': check_islands,
+    'mutation': check_mutation,
+    'scoring': check_scoring,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Timetable GA regression checks')
+    parser.add_argument('checks', nargs='*', metavar='CHECK', help='checks to run, all by default: ' + ', '.join(CHECKS))
+    args = parser.parse_args()
+    for name in args.checks:
+        if name not in CHECKS:
+            parser.error('unknown check ' + name)
+
+    failed = 0
+    for name in args.checks or CHECKS:
+        try:
+            CHECKS[name]()
+        except AssertionError as error:
+            failed += 1
+            print(name + ': FAILED ' + str(error))
+        else:
+            print(name + ': ok')
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from scoring import ConstraintScorer
+
+# Schedules are int32 arrays of cell values, see problem.py, and a population is a
+# (schedules, time slots, classrooms) array of them.
+DTYPE = np.int32
+
+
+class GAParams:
+    def __init__(self, population_size=100, generations=1000, mutation_rate=0.1, crossover_rate=0.8,
+                 crossover_type='one_point', tournament_size=2, elite_size=2, seed=None,
+                 islands=1, workers=None, migration_interval=50, migrants=2):
+        if crossover_type not in ('one_point', 'uniform'):
+            raise ValueError("Unknown crossover type: " + str(crossover_type))
+        self.population_size = population_size
+        self.generations = generations
+        self.mutation_rate = mutation_rate
+        self.crossover_rate = crossover_rate
+        self.crossover_type = crossover_type
+        self.tournament_size = tournament_size
+        self.elite_size = elite_size
+        self.seed = seed
+        self.islands = islands
+        self.workers = workers
+        self.migration_interval = migration_interval
+        self.migrants = migrants
+
+
+# Schedules with every subject placed as many times as required, in distinct random cells
+def random_population(problem, size, rng):
+    sessions = np.repeat(np.arange(1, len(problem.subjects) + 1), [s.sessions for s in problem.subjects])
+    population = np.zeros((size, problem.cells), dtype=DTYPE)
+    chosen = rng.random((size, problem.cells)).argsort(axis=1)[:, :len(sessions)]
+    population[np.arange(size)[:, np.newaxis], chosen] = sessions
+    return population.reshape((size,) + problem.shape)
+
+# Indexes of count winners, each the fittest of k schedules drawn with replacement
+def tournament_selection(scores, count, k, rng):
+    contenders = rng.integers(0, len(scores), size=(count, k))
+    return contenders[np.arange(count), scores[contenders].argmax(axis=1)]
+
+# Crosses pairs of parents into children1 and children2. Pairs that are not crossed over
+# are copied as they are. A one-point crossover swaps whole time slots after the point.
+def crossover(parents1, parents2, children1, children2, params, rng):
+    pairs, slots, rooms = parents1.shape
+    if params.crossover_type == 'uniform':
+        keep = rng.random((pairs, slots, rooms)) < 0.5
+    else:
+        points = rng.integers(0, slots + 1, size=pairs)
+        keep = np.broadcast_to((np.arange(slots) < points[:, np.newaxis])[:, :, np.newaxis], parents1.shape).copy()
+    keep[rng.random(pairs) >= params.crossover_rate] = True
+    np.copyto(children1, np.where(keep, parents1, parents2))
+    np.copyto(children2, np.where(keep, parents2, parents1))
+
+# Replaces each cell, with probability mutation_rate, by a random subject, in place.
+# Mutation never empties a room; cell values run from 1 to values - 1.
+def mutate(population, values, params, rng):
+    mask = rng.random(population.shape) < params.mutation_rate
+    np.copyto(population, rng.integers(1, values, size=population.shape, dtype=DTYPE), where=mask)
+
+# Evolves the population in place. Each generation is written into a second buffer and
+# the two are swapped, so no arrays are allocated per child.
+def evolve(population, generations, scorer, params, rng):
+    size, schedule_shape = len(population), population.shape[1:]
+    elite_size = params.elite_size
+    current, following = population, np.empty_like(population)
+    pairs = (size - elite_size + 1) // 2
+    parents = np.empty((2, pairs) + schedule_shape, dtype=population.dtype)
+    children = np.empty_like(parents)
+
+    for generation in range(generations):
+        # Fitness is computed once per generation
+        scores = scorer(current)
+
+        elites = np.argsort(-scores, kind='stable')[:elite_size]
+        following[:elite_size] = current[elites]
+
+        selected = tournament_selection(scores, 2 * pairs, params.tournament_size, rng)
+        np.take(current, selected, axis=0, out=parents.reshape((-1,) + schedule_shape))
+        crossover(parents[0], parents[1], children[0], children[1], params, rng)
+        mutate(children, scorer.values, params, rng)
+        following[elite_size:] = children.reshape((-1,) + schedule_shape)[:size - elite_size]
+
+        current, following = following, current
+
+    if current is not population:
+        population[:] = current
+    return population
+
+
+# Island model: every island is evolved by a worker process directly inside one shared
+# memory block, so populations never get pickled. Between epochs of migration_interval
+# generations the best schedules of each island replace the worst ones of the next
+# island in a ring. Each island draws from its own seed sequence, so a seed gives the
+# same result whatever the number of workers.
+_island_context = None
+
+def _init_island_worker(problem, params):
+    global _island_context
+    _island_context = ConstraintScorer(problem), params
+
+def _evolve_island(name, shape, island, generations, seed_sequence):
+    scorer, params = _island_context
+    memory = shared_memory.SharedMemory(name=name)
+    try:
+        populations = np.ndarray(shape, dtype=DTYPE, buffer=memory.buf)
+        evolve(populations[island], generations, scorer, params, np.random.default_rng(seed_sequence))
+        del populations
+    finally:
+        memory.close()
+
+def migrate(populations, migrants, scorer):
+    islands, size = populations.shape[:2]
+    scores = scorer(populations.reshape((-1,) + populations.shape[2:])).reshape(islands, size)
+    order = np.argsort(-scores, axis=1, kind='stable')
+    rows = np.arange(islands)[:, np.newaxis]
+    best = populations[rows, order[:, :migrants]]
+    populations[rows, order[:, size - migrants:]] = np.roll(best, 1, axis=0)
+
+def _run_islands(problem, params, scorer):
+    island_seeds = np.random.SeedSequence(params.seed).spawn(params.islands)
+    shape = (params.islands, params.population_size) + problem.shape
+    memory = shared_memory.SharedMemory(create=True, size=int(np.prod(shape)) * np.dtype(DTYPE).itemsize)
+    try:
+        populations = np.ndarray(shape, dtype=DTYPE, buffer=memory.buf)
+        for island, island_seed in enumerate(island_seeds):
+            rng = np.random.default_rng(island_seed.spawn(1)[0])
+            populations[island] = random_population(problem, params.population_size, rng)
+
+        with ProcessPoolExecutor(params.workers, initializer=_init_island_worker,
+                                 initargs=(problem, params)) as executor:
+            done = 0
+            while done < params.generations:
+                epoch = min(params.migration_interval, params.generations - done)
+                epoch_seeds = [island_seed.spawn(1)[0] for island_seed in island_seeds]
+                list(executor.map(_evolve_island, repeat(memory.name), repeat(shape),
+                                  range(params.islands), repeat(epoch), epoch_seeds))
+                done += epoch
+                if done < params.generations:
+                    migrate(populations, params.migrants, scorer)
+
+        population = populations.reshape((-1,) + problem.shape).copy()
+        del populations
+        return population
+    finally:
+        memory.close()
+        memory.unlink()
+
+
+# Returns the best schedule found and its score
+def run_ga(problem, params=None):
+    params = params or GAParams()
+    scorer = ConstraintScorer(problem)
+    if params.islands > 1:
+        population = _run_islands(problem, params, scorer)
+    else:
+        rng = np.random.default_rng(params.seed)
+        population = random_population(problem, params.population_size, rng)
+        evolve(population, params.generations, scorer, params, rng)
+
+    scores = scorer(population)
+    best = int(np.argmax(scores))
+    return population[best], int(scores[best])
@@ -1,87 +1,39 @@
-import random
-import numpy as np
-from functools import cmp_to_key
-
-subjects = ["Math", "English", "Science", "History", "Physical Education"]
-classrooms = [1, 2, 3]
-time_slots = ["9-10", "10-11", "11-12", "12-1", "1-2"]
-
-# Parameters
-population_size = 100
-num_generations = 1000
-mutation_rate = 0.1
-crossover_rate = 0.8
-elite_size = 2
-
-def generate_random_schedule():
-    schedule = np.zeros((len(time_slots), len(classrooms)), dtype=int)
-    for i, subject in enumerate(subjects):
-        row, col = random.randint(0, len(time_slots)-1), random.randint(0, len(classrooms)-1)
-        while schedule[row][col] != 0:
-            row, col = random.randint(0, len(time_slots)-1), random.randint(0, len(classrooms)-1)
-        schedule[row][col] = i + 1
-    return schedule
-
-def fitness(schedule):
-    score = 0
-
-    for row in range(len(time_slots)):
-        for col in range(len(classrooms)):
-            if np.count_nonzero(schedule[row] == schedule[row][col]) > 1:
-                score -= 1
-
-    subject_counts = np.array([np.count_nonzero(schedule == i + 1) for i in range(len(subjects))])
-    score += np.sum(subject_counts == 1)
-
-    return score
-
-def tournament_selection(population, k=2):
-    return random.sample(population, k=max(k, 2))
-
-def crossover(parent1, parent2):
-    crossover_point = random.randint(0, len(parent1))
-    child1 = np.vstack((parent1[:crossover_point], parent2[crossover_point:]))
-    child2 = np.vstack((parent2[:crossover_point], parent1[crossover_point:]))
-    return child1, child2
-
-def mutate(schedule):
-    mutated_schedule = schedule.copy()
-    for i in range(len(time_slots)):
-        for j in range(len(classrooms)):
-            if random.random() < mutation_rate:
-                mutated_schedule[i][j] = random.choice(range(len(subjects))) + 1
-    return mutated_schedule
-
-population = [generate_random_schedule() for _ in range(population_size)]
-
-for generation in range(num_generations):
-    population.sort(key=cmp_to_key(lambda a, b: fitness(b) - fitness(a)))
-
-    elites = population[:elite_size]
-
-    parents = []
-    for _ in range(population_size // 2 - elite_size):
-        parent1, parent2 = tournament_selection(population)
-        parents.append((parent1, parent2))
-
-    children = []
-    for parent1, parent2 in parents:
-        if random.random() < crossover_rate:
-            child1, child2 = crossover(parent1, parent2)
-        else:
-            child1, child2 = parent1, parent2
-        children.append(child1)
-        children.append(child2)
-
-    for i in range(len(children)):
-        children[i] = mutate(children[i])
-
-    population = elites + children
-
-best_schedule = max(population, key=fitness)
-
-print("Best schedule (fitness score = {}):".format(fitness(best_schedule)))
-for i, row in enumerate(best_schedule):
-    for j, cell in enumerate(row):
-        if cell != 0:
-            print("{} in Classroom {} during {}".format(subjects[cell - 1], classrooms[j], time_slots[i]))
\ No newline at end of file
+import argparse
+
+from ga import GAParams, run_ga
+from problem import load_problem
+
+PROBLEM = 'data/timetable.json'
+
+
+def main():
+    defaults = GAParams()
+    parser = argparse.ArgumentParser(description='Genetic algorithm timetable scheduler')
+    parser.add_argument('problem', nargs='?', default=PROBLEM, help='timetable problem as JSON or CSV')
+    parser.add_argument('--population-size', type=int, default=defaults.population_size)
+    parser.add_argument('--generations', type=int, default=defaults.generations)
+    parser.add_argument('--mutation-rate', type=float, default=defaults.mutation_rate)
+    parser.add_argument('--crossover-rate', type=float, default=defaults.crossover_rate)
+    parser.add_argument('--crossover-type', choices=['one_point', 'uniform'], default=defaults.crossover_type)
+    parser.add_argument('--tournament-size', type=int, default=defaults.tournament_size)
+    parser.add_argument('--elite-size', type=int, default=defaults.elite_size)
+    parser.add_argument('--seed', type=int)
+    parser.add_argument('--islands', type=int, default=1, help='subpopulations evolved in parallel')
+    parser.add_argument('--workers', type=int, help='worker processes for the islands')
+    parser.add_argument('--migration-interval', type=int, default=defaults.migration_interval)
+    parser.add_argument('--migrants', type=int, default=defaults.migrants)
+    args = parser.parse_args()
+
+    problem = load_problem(args.problem)
+    params = GAParams(args.population_size, args.generations, args.mutation_rate, args.crossover_rate,
+                      args.crossover_type, args.tournament_size, args.elite_size, args.seed,
+                      args.islands, args.workers, args.migration_interval, args.migrants)
+    schedule, score = run_ga(problem, params)
+
+    print("Best schedule (fitness score = {}):".format(score))
+    for line in problem.describe(schedule):
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+import csv
+import json
+
+# A schedule is a (time slots, classrooms) int array holding, for every room and slot,
+# 1 + the index of the subject taught there, or 0 when the room is empty.
+
+
+class Subject:
+    def __init__(self, name, teacher=None, students=0, sessions=1):
+        self.name = name
+        self.teacher = teacher
+        self.students = students
+        self.sessions = sessions
+
+
+class Classroom:
+    def __init__(self, name, capacity=None):
+        self.name = name
+        self.capacity = capacity
+
+
+class TimetableProblem:
+    def __init__(self, subjects, classrooms, time_slots, empty_rooms_clash=False):
+        self.subjects = list(subjects)
+        self.classrooms = list(classrooms)
+        self.time_slots = list(time_slots)
+        # The original lab scored two empty rooms in the same slot as a clash
+        self.empty_rooms_clash = empty_rooms_clash
+
+        if not self.subjects or not self.classrooms or not self.time_slots:
+            raise ValueError("A timetable needs subjects, classrooms and time slots")
+        if sum(subject.sessions for subject in self.subjects) > self.cells:
+            raise ValueError("More sessions than rooms and time slots to hold them")
+
+    @property
+    def shape(self):
+        return len(self.time_slots), len(self.classrooms)
+
+    @property
+    def cells(self):
+        return len(self.time_slots) * len(self.classrooms)
+
+    def describe(self, schedule):
+        for i, row in enumerate(schedule.tolist()):
+            for j, cell in enumerate(row):
+                if cell != 0:
+                    yield "{} in Classroom {} during {}".format(
+                        self.subjects[cell - 1].name, self.classrooms[j].name, self.time_slots[i])
+
+
+def problem_from_dict(data):
+    subjects = [Subject(item['name'], item.get('teacher'), item.get('students', 0), item.get('sessions', 1))
+                for item in data['subjects']]
+    classrooms = [Classroom(item['name'], item.get('capacity')) if isinstance(item, dict) else Classroom(item)
+                  for item in data['classrooms']]
+    return TimetableProblem(subjects, classrooms, data['time_slots'], data.get('empty_rooms_clash', False))
+
+# One row per item: kind is subject, classroom or time_slot, and only the columns that
+# apply to the kind need a value. The header names the columns, kind and name at least.
+CSV_COLUMNS = ['kind', 'name', 'teacher', 'students', 'sessions', 'capacity']
+
+def problem_from_csv(file):
+    reader = csv.DictReader(file)
+    columns = reader.fieldnames or []
+    unknown = [column for column in columns if column not in CSV_COLUMNS]
+    if unknown or 'kind' not in columns or 'name' not in columns:
+        raise ValueError("Expected a header of columns among " + ', '.join(CSV_COLUMNS) +
+                         " with kind and name, got: " + ', '.join(columns))
+
+    subjects, classrooms, time_slots = [], [], []
+    for line, row in enumerate(reader, 2):
+        kind, name = row.get('kind'), row.get('name')
+        if kind == 'subject':
+            subjects.append(Subject(name, row.get('teacher') or None, int(row.get('students') or 0),
+                                    int(row.get('sessions') or 1)))
+        elif kind == 'classroom':
+            capacity = row.get('capacity')
+            classrooms.append(Classroom(name, int(capacity) if capacity else None))
+        elif kind == 'time_slot':
+            time_slots.append(name)
+        else:
+            raise ValueError("Unknown kind on line " + str(line) + ": " + str(kind))
+    return TimetableProblem(subjects, classrooms, time_slots)
+
+def load_problem(path):
+    with open(path, newline='') as file:
+        if path.endswith('.csv'):
+            return problem_from_csv(file)
+        return problem_from_dict(json.load(file))
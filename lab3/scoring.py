@@ -0,0 +1,59 @@
+import numpy as np
+
+# Scores whole populations of schedules, (schedules, time slots, classrooms) arrays, in a
+# few bincounts. The constraints of the problem are compiled once into lookup arrays
+# indexed by cell value, so scoring costs the same per cell however many subjects,
+# teachers and rooms there are.
+#
+# A schedule earns a point for every subject held exactly as many times as required and
+# loses one for every cell in a clash: a subject in two rooms at once, a teacher in two
+# rooms at once, or a class too big for its room.
+
+
+class ConstraintScorer:
+    def __init__(self, problem):
+        subjects = problem.subjects
+        self.values = len(subjects) + 1
+        self.empty_rooms_clash = problem.empty_rooms_clash
+
+        self.required = np.array([subject.sessions for subject in subjects])
+
+        names = sorted({subject.teacher for subject in subjects if subject.teacher is not None})
+        ids = {name: i + 1 for i, name in enumerate(names)}
+        self.teachers = len(names) + 1
+        self.teacher = np.array([0] + [ids.get(subject.teacher, 0) for subject in subjects])
+
+        students = np.array([0] + [subject.students for subject in subjects])
+        capacity = np.array([np.inf if room.capacity is None else room.capacity for room in problem.classrooms])
+        self.too_small = students[:, np.newaxis] > capacity
+        self.check_capacity = bool(self.too_small.any())
+
+    def __call__(self, population):
+        population = np.asarray(population)
+        size, slots, rooms = population.shape
+        rows = np.arange(size * slots).repeat(rooms)
+
+        # Occurrences of every value in every time slot of every schedule
+        counts = self._count(rows, population, self.values, size, slots)
+        if not self.empty_rooms_clash:
+            counts[:, :, 0] = 0
+        score = -np.where(counts > 1, counts, 0).sum(axis=(1, 2))
+        score += (counts[:, :, 1:].sum(axis=1) == self.required).sum(axis=1)
+
+        if self.teachers > 1:
+            counts = self._count(rows, self.teacher[population], self.teachers, size, slots)
+            counts[:, :, 0] = 0
+            score -= np.where(counts > 1, counts, 0).sum(axis=(1, 2))
+
+        if self.check_capacity:
+            score -= self.too_small[population, np.arange(rooms)].sum(axis=(1, 2))
+
+        return score
+
+    @staticmethod
+    def _count(rows, cells, values, size, slots):
+        counts = np.bincount(rows * values + cells.ravel(), minlength=size * slots * values)
+        return counts.reshape(size, slots, values)
+
+    def score(self, schedule):
+        return int(self(schedule[np.newaxis])[0])
@@ -0,0 +1,123 @@
+from collections import OrderedDict
+
+from csp import has_matching
+
+# Conflict-directed backjumping (Prosser) with nogood learning. Subjects are assigned in
+# a fixed order, fewest available periods first, and each level remembers the earlier
+# levels whose assignments ruled out one of its periods. When a level runs out of
+# periods the search jumps straight back to the latest of them instead of the level
+# just before, and the assignments of those levels are learned as a nogood so the same
+# combination is rejected at once when the search runs into it again.
+
+DEFAULT_MAX_NOGOODS = 10000
+# Longer nogoods rarely match again and cost the most to check
+DEFAULT_MAX_NOGOOD_SIZE = 8
+
+
+# Learned nogoods, each a tuple of (subject, period) pairs that cannot all hold at once,
+# listed in the order the subjects are assigned. The last pair is the only one a nogood
+# can be completed by, so each nogood is only watched there. When full the least
+# recently useful nogood is evicted.
+class NogoodCache:
+    def __init__(self, max_size=DEFAULT_MAX_NOGOODS, max_length=DEFAULT_MAX_NOGOOD_SIZE):
+        self.max_size = max_size
+        self.max_length = max_length
+        self.nogoods = OrderedDict()
+        self.watching = {}
+
+    def __len__(self):
+        return len(self.nogoods)
+
+    def add(self, nogood):
+        if not nogood or len(nogood) > self.max_length or self.max_size <= 0 or nogood in self.nogoods:
+            return
+        if len(self.nogoods) >= self.max_size:
+            evicted, _ = self.nogoods.popitem(last=False)
+            self.watching[evicted[-1]].discard(evicted)
+        self.nogoods[nogood] = None
+        self.watching.setdefault(nogood[-1], set()).add(nogood)
+
+    # A nogood that assigning period to subject would complete, or None
+    def violated(self, subject, period, assigned):
+        for nogood in self.watching.get((subject, period), ()):
+            if all(assigned.get(other) == value for other, value in nogood[:-1]):
+                self.nogoods.move_to_end(nogood)
+                return nogood
+        return None
+
+
+class BackjumpingSolver:
+    def __init__(self, subjects, periods, teachers, teacher_availability,
+                 max_nogoods=DEFAULT_MAX_NOGOODS, max_nogood_size=DEFAULT_MAX_NOGOOD_SIZE):
+        self.subjects = list(subjects)
+        self.periods = list(periods)
+        self.teachers = teachers
+        self.teacher_availability = teacher_availability
+        allowed = set(self.periods)
+        self.domains = {subject: [period for period in teacher_availability.get(teachers[subject], ())
+                                  if period in allowed]
+                        for subject in self.subjects}
+        self.order = sorted(self.subjects, key=lambda subject: len(self.domains[subject]))
+        self.nogoods = NogoodCache(max_nogoods, max_nogood_size)
+        self.nodes = 0
+        self.backjumps = 0
+
+    def solve(self):
+        # No order of the search can place more subjects than they have periods between
+        # them, and proving it by search takes exponential time
+        if not has_matching(self.subjects, self.periods, self.teachers, self.teacher_availability):
+            return None
+
+        order, domains, nogoods = self.order, self.domains, self.nogoods
+        level_of = {subject: level for level, subject in enumerate(order)}
+        assigned = {}
+        holder = {}
+        conflicts = [set() for _ in order]
+        remaining = [None] * len(order)
+        level = 0
+
+        while 0 <= level < len(order):
+            subject = order[level]
+            if remaining[level] is None:
+                remaining[level] = iter(domains[subject])
+
+            for period in remaining[level]:
+                self.nodes += 1
+                # is_safe: the period must be free and complete no nogood
+                if period in holder:
+                    conflicts[level].add(level_of[holder[period]])
+                    continue
+                nogood = nogoods.violated(subject, period, assigned)
+                if nogood is not None:
+                    conflicts[level].update(level_of[other] for other, _ in nogood if other != subject)
+                    continue
+                assigned[subject] = period
+                holder[period] = subject
+                level += 1
+                break
+            else:
+                # Dead end: the conflict set explains why no period is left for the subject
+                conflict = conflicts[level]
+                if not conflict:
+                    return None
+                back = max(conflict)
+                # The search never comes back to an assignment of all of the first levels,
+                # so only a nogood that leaves out one of them can ever fire
+                if len(conflict) <= back:
+                    nogoods.add(tuple((order[past], assigned[order[past]]) for past in sorted(conflict)))
+
+                conflicts[back].update(conflict - {back})
+                for past in range(back + 1, level + 1):
+                    conflicts[past] = set()
+                    remaining[past] = None
+                for past in range(back, level):
+                    del holder[assigned.pop(order[past])]
+                if back < level - 1:
+                    self.backjumps += 1
+                level = back
+
+        return {subject: assigned[subject] for subject in self.subjects}
+
+
+def backjumping_schedule(subjects, periods, teachers, teacher_availability):
+    return BackjumpingSolver(subjects, periods, teachers, teacher_availability).solve()
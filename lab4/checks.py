@@ -0,0 +1,187 @@
+import argparse
+import itertools
+import random
+import sys
+
+from backjump import BackjumpingSolver
+from csp import TimetableCSP
+from main import timetable_schedule
+from parallel import count_solutions, parallel_schedule, portfolio_schedule
+from repair import apply_changes, repair_schedule
+
+# Regression checks for the timetable solvers, run with `python checks.py [name ...]`.
+# Each check raises AssertionError when it fails. Instances are small enough to be
+# solved by brute force, which the solvers are compared against.
+
+
+# n subjects taught by k teachers, each available in a random share of the periods
+def random_instance(rng, subjects, periods, teachers, density):
+    names = ['s' + str(i) for i in range(subjects)]
+    periods = list(range(1, periods + 1))
+    teacher_of = {subject: 't' + str(rng.randrange(teachers)) for subject in names}
+    availability = {'t' + str(t): [period for period in periods if rng.random() < density] for t in range(teachers)}
+    return names, periods, teacher_of, availability
+
+def small_instance(rng):
+    subjects = rng.randint(1, 7)
+    return random_instance(rng, subjects, rng.randint(subjects, 8), rng.randint(1, subjects), rng.random())
+
+def assignments(subjects, periods, teachers, teacher_availability):
+    for chosen in itertools.permutations(periods, len(subjects)):
+        if all(period in teacher_availability[teachers[subject]] for subject, period in zip(subjects, chosen)):
+            yield chosen
+
+def is_feasible(*instance):
+    return next(assignments(*instance), None) is not None
+
+# A timetable gives every subject its own period, so one exists exactly when subjects
+# and allowed periods have a matching that covers every subject (Kuhn's algorithm)
+def has_matching(subjects, periods, teachers, teacher_availability):
+    allowed = set(periods)
+    holder = {}
+
+    def place(subject, seen):
+        for period in teacher_availability.get(teachers[subject], ()):
+            if period in allowed and period not in seen:
+                seen.add(period)
+                if period not in holder or place(holder[period], seen):
+                    holder[period] = subject
+                    return True
+        return False
+
+    return all(place(subject, set()) for subject in subjects)
+
+def is_valid(solution, subjects, periods, teachers, teacher_availability):
+    return (sorted(solution) == sorted(subjects) and len(set(solution.values())) == len(subjects)
+            and all(solution[subject] in periods and solution[subject] in teacher_availability[teachers[subject]]
+                    for subject in subjects))
+
+def check_solution(solution, instance, feasible, where):
+    if solution is None:
+        assert not feasible, where + ': no solution found'
+    else:
+        assert feasible, where + ': solved an infeasible instance'
+        assert is_valid(solution, *instance), where + ': invalid solution ' + str(solution)
+
+
+# n subjects of one teacher, available in only n - 1 periods
+def pigeonhole_instance(subjects):
+    names = ['s' + str(i) for i in range(subjects)]
+    return names, list(range(subjects - 1)), dict.fromkeys(names, 't'), {'t': list(range(subjects - 1))}
+
+# The CSP solver and the original backtracking search find a valid timetable exactly
+# when there is one, and the CSP solver sees that more subjects than periods cannot fit
+# without searching
+def check_csp(trials=400):
+    rng = random.Random(0)
+    for trial in range(trials):
+        instance = small_instance(rng)
+        feasible = is_feasible(*instance)
+        for solver in ('csp', 'backtracking'):
+            check_solution(timetable_schedule(*instance, solver=solver), instance, feasible,
+                           'trial ' + str(trial) + ', ' + solver)
+
+    for instance in (pigeonhole_instance(12), contested_instance(20, 5), contested_instance(400, 7)):
+        solver = TimetableCSP(*instance)
+        assert solver.solve() is None, str(len(instance[0])) + ' subjects: solved an infeasible instance'
+        assert solver.nodes == 0, str(len(instance[0])) + ' subjects: ' + str(solver.nodes) + ' nodes'
+
+
+# Counting over cubes gives the brute-force number of timetables, and the parallel
+# searches find a valid one exactly when there is one
+def check_parallel(trials=30):
+    rng = random.Random(3)
+    for trial in range(trials):
+        instance = small_instance(rng)
+        expected = sum(1 for _ in assignments(*instance))
+        counted = count_solutions(*instance, workers=3)
+        assert counted == expected, 'trial ' + str(trial) + ': counted ' + str(counted) + ', expected ' + str(expected)
+        check_solution(parallel_schedule(*instance, workers=2), instance, expected > 0, 'trial ' + str(trial) + ', cubes')
+        check_solution(portfolio_schedule(*instance, workers=3), instance, expected > 0,
+                       'trial ' + str(trial) + ', portfolio')
+
+
+# k subjects competing for k - 1 periods, placed last behind n - k unrelated ones that
+# can also take one of those periods: infeasible, but only the last subjects show it
+def contested_instance(subjects, contested):
+    rng = random.Random(subjects)
+    names = ['s' + str(i) for i in range(subjects)]
+    periods = list(range(3 * subjects))
+    teachers = {subject: 't' + subject for subject in names}
+    availability = {'t' + subject: rng.sample(periods[contested:], 3) for subject in names}
+    for subject in names[:contested]:
+        availability['t' + subject] = availability['t' + subject][:2] + [rng.randrange(contested - 1)]
+    for subject in names[-contested:]:
+        availability['t' + subject] = periods[:contested - 1]
+    return names, periods, teachers, availability
+
+# Backjumping finds a valid timetable exactly when there is one, whether nogoods are
+# not kept, kept in a tiny cache or kept freely, and refuses instances with more
+# subjects than periods to share between them without searching
+def check_backjumping(trials=500):
+    rng = random.Random(5)
+    for trial in range(trials):
+        instance = small_instance(rng)
+        feasible = is_feasible(*instance)
+        for max_nogoods, max_nogood_size in ((0, 8), (3, 2), (10000, 8)):
+            solver = BackjumpingSolver(*instance, max_nogoods=max_nogoods, max_nogood_size=max_nogood_size)
+            check_solution(solver.solve(), instance, feasible,
+                           'trial ' + str(trial) + ' with ' + str(max_nogoods) + ' nogoods')
+
+    for instance in (pigeonhole_instance(12), contested_instance(20, 5), contested_instance(400, 7)):
+        solver = BackjumpingSolver(*instance)
+        assert solver.solve() is None, str(len(instance[0])) + ' subjects: solved an infeasible instance'
+        assert solver.nodes == 0, str(len(instance[0])) + ' subjects: ' + str(solver.nodes) + ' nodes'
+
+
+# After a teacher loses some periods and a subject changes teacher, the repaired
+# timetable is valid, and there is none only when the changed instance has no matching
+def check_repair(trials=300):
+    rng = random.Random(1)
+    for trial in range(trials):
+        count = rng.randint(2, 60)
+        subjects, periods, teachers, availability = instance = \
+            random_instance(rng, count, count + rng.randint(0, 10), rng.randint(1, count), rng.uniform(0.3, 0.9))
+        solution = timetable_schedule(*instance)
+        if solution is None:
+            continue
+
+        teacher = rng.choice(sorted(availability))
+        availability_changes = {teacher: [period for period in availability[teacher] if rng.random() < 0.6]}
+        teacher_changes = {rng.choice(subjects): rng.choice(sorted(availability))}
+        repaired = repair_schedule(solution, subjects, periods, teachers, availability,
+                                   teacher_changes, availability_changes, seed=trial)
+        changed = (subjects, periods) + apply_changes(teachers, availability, teacher_changes, availability_changes)
+        check_solution(repaired, changed, has_matching(*changed), 'trial ' + str(trial))
+
+
+CHECKS = {
+    'csp': check_csp,
+    'parallel': check_parallel,
+    'backjumping': check_backjumping,
+    'repair': check_repair,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Timetable solver regression checks')
+    parser.add_argument('checks', nargs='*', metavar='CHECK', help='checks to run, all by default: ' + ', '.join(CHECKS))
+    args = parser.parse_args()
+    for name in args.checks:
+        if name not in CHECKS:
+            parser.error('unknown check ' + name)
+
+    failed = 0
+    for name in args.checks or CHECKS:
+        try:
+            CHECKS[name]()
+        except AssertionError as error:
+            failed += 1
+            print(name + ': FAILED ' + str(error))
+        else:
+            print(name + ': ok')
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+# Timetabling as a constraint satisfaction problem: every subject is a variable whose
+# values are the periods its teacher is available in, and no two subjects may share a
+# period. Domains are bitsets, Python ints with one bit per position in periods.
+
+import random
+
+# How many nodes the search expands between checks of the stop event
+STOP_CHECK_NODES = 1024
+
+
+def bits(mask):
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+class TimetableCSP:
+    # A seed randomizes the order among equally good subjects and periods. The search
+    # gives up when stop, an event like multiprocessing.Event, gets set.
+    def __init__(self, subjects, periods, teachers, teacher_availability, seed=None, stop=None):
+        self.subjects = list(subjects)
+        self.periods = list(periods)
+        position = {period: i for i, period in enumerate(self.periods)}
+
+        self.domains = []
+        for subject in self.subjects:
+            domain = 0
+            for period in teacher_availability.get(teachers[subject], ()):
+                if period in position:
+                    domain |= 1 << position[period]
+            self.domains.append(domain)
+
+        # How many subjects still have each period in their domain
+        self.support = [0] * len(self.periods)
+        for domain in self.domains:
+            for i in bits(domain):
+                self.support[i] += 1
+
+        # A matching of subjects to periods within the domains: period index of every
+        # subject and subject of every period, None where there is none yet
+        self.matched = [None] * len(self.subjects)
+        self.holder = [None] * len(self.periods)
+
+        self.unassigned = set(range(len(self.subjects)))
+        # (subject, previous domain) for every domain change, so a failed branch is undone
+        # by popping back to where it started
+        self.trail = []
+        self.nodes = 0
+        self.rng = None if seed is None else random.Random(seed)
+        self.stop = stop
+
+    def _remove(self, var, mask):
+        domain = self.domains[var]
+        removed = domain & mask
+        if removed:
+            self.trail.append((var, domain))
+            self.domains[var] = domain ^ removed
+            for i in bits(removed):
+                self.support[i] -= 1
+
+    def _undo(self, mark):
+        trail, domains, support = self.trail, self.domains, self.support
+        while len(trail) > mark:
+            var, domain = trail.pop()
+            for i in bits(domain & ~domains[var]):
+                support[i] += 1
+            domains[var] = domain
+
+    # AC-3 for the not-equal constraints: a value is only unsupported when the other end of
+    # an arc is down to that single value, so the queue holds the subjects whose domain
+    # became a singleton and their value is removed from every unassigned subject.
+    # Starting from a just assigned subject this is forward checking, continued until
+    # nothing changes.
+    def _propagate(self, queue):
+        domains, unassigned = self.domains, self.unassigned
+        while queue:
+            var = queue.pop()
+            value = domains[var]
+            for other in unassigned:
+                if other != var and domains[other] & value:
+                    self._remove(other, value)
+                    domain = domains[other]
+                    if not domain:
+                        return False
+                    if not domain & (domain - 1):
+                        queue.append(other)
+        return True
+
+    def _assign(self, var, i):
+        self._remove(var, self.domains[var] & ~(1 << i))
+        self.unassigned.discard(var)
+        return self._propagate([var]) and self._match()
+
+    # The all-different (Hall) check that AC-3 on the pairwise constraints misses: every
+    # subject needs a period of its own, so the domains must have a matching that covers
+    # them all. Domains only shrink going down the search and grow back on undo, so the
+    # matching of the last check stays valid except for the subjects that lost their
+    # period, and only those are matched again.
+    def _match(self):
+        domains, matched, holder = self.domains, self.matched, self.holder
+        for var, i in enumerate(matched):
+            if i is not None and not domains[var] >> i & 1:
+                matched[var] = holder[i] = None
+        return all(i is not None or self._augment(var) for var, i in enumerate(matched))
+
+    # Breadth-first search for an augmenting path from an unmatched subject: periods are
+    # visited at most once, and a free one ends the path, which is then flipped
+    def _augment(self, var):
+        domains, matched, holder = self.domains, self.matched, self.holder
+        reached_from = {}
+        seen = 0
+        queue = [var]
+        for current in queue:
+            fresh = domains[current] & ~seen
+            seen |= fresh
+            for i in bits(fresh):
+                reached_from[i] = current
+                if holder[i] is None:
+                    while i is not None:
+                        current = reached_from[i]
+                        matched[current], holder[i], i = i, current, matched[current]
+                    return True
+                queue.append(holder[i])
+        return False
+
+    # Minimum remaining values, ties broken by degree: the subject whose periods are
+    # wanted by the most other subjects
+    def _select_variable(self):
+        domains = self.domains
+        smallest = min(domains[var].bit_count() for var in self.unassigned)
+        candidates = [var for var in self.unassigned if domains[var].bit_count() == smallest]
+        if len(candidates) == 1:
+            return candidates[0]
+        support, rng = self.support, self.rng
+        return max(candidates, key=lambda var: (sum(support[i] for i in bits(domains[var])),
+                                                rng.random() if rng else -var))
+
+    # Least constraining value first: the period the fewest other subjects could take
+    def _order_values(self, var):
+        support, rng = self.support, self.rng
+        if rng:
+            return sorted(bits(self.domains[var]), key=lambda i: (support[i], rng.random()))
+        return sorted(bits(self.domains[var]), key=lambda i: support[i])
+
+    def solution(self):
+        return {subject: self.periods[self.domains[var].bit_length() - 1]
+                for var, subject in enumerate(self.subjects)}
+
+    # Checks the domains and propagates the subjects that have a single period left; False
+    # when there is no solution
+    def prepare(self):
+        if not all(self.domains):
+            return False
+        singletons = [var for var, domain in enumerate(self.domains) if not domain & (domain - 1)]
+        return self._propagate(singletons) and self._match()
+
+    # Fixes subjects to periods, given as (subject index, period index) pairs
+    def assign_all(self, assignments):
+        return all(self._assign(var, i) for var, i in assignments)
+
+    # The subject the search would branch on next and, in search order, the periods left
+    # for it that survive propagation
+    def split(self):
+        var = self._select_variable()
+        values = []
+        for i in self._order_values(var):
+            mark = len(self.trail)
+            if self._assign(var, i):
+                values.append(i)
+            self._undo(mark)
+            self.unassigned.add(var)
+        return var, values
+
+    # Every solution below the current state, found depth-first with an explicit stack of
+    # (subject, values left, trail mark) so the depth is not limited by the recursion limit
+    def solutions(self):
+        if not self.unassigned:
+            yield self.solution()
+            return
+
+        var = self._select_variable()
+        stack = [(var, iter(self._order_values(var)), len(self.trail))]
+        next_check = self.nodes + STOP_CHECK_NODES
+        while stack:
+            if self.stop is not None and self.nodes >= next_check:
+                if self.stop.is_set():
+                    return
+                next_check = self.nodes + STOP_CHECK_NODES
+            var, values, mark = stack[-1]
+            for i in values:
+                self.nodes += 1
+                if self._assign(var, i):
+                    break
+                self._undo(mark)
+                self.unassigned.add(var)
+            else:
+                stack.pop()
+                if stack:
+                    self._undo(stack[-1][2])
+                    self.unassigned.add(stack[-1][0])
+                continue
+
+            if not self.unassigned:
+                yield self.solution()
+                self._undo(mark)
+                self.unassigned.add(var)
+                continue
+            var = self._select_variable()
+            stack.append((var, iter(self._order_values(var)), len(self.trail)))
+
+    def solve(self):
+        if not self.prepare():
+            return None
+        return next(self.solutions(), None)
+
+
+def csp_schedule(subjects, periods, teachers, teacher_availability):
+    return TimetableCSP(subjects, periods, teachers, teacher_availability).solve()
+
+
+# Whether every subject can have a period of its own, which is exactly when a timetable
+# exists; much cheaper than a search that fails
+def has_matching(subjects, periods, teachers, teacher_availability):
+    return TimetableCSP(subjects, periods, teachers, teacher_availability).prepare()
@@ -1,3 +1,9 @@
+import argparse
+
+from backjump import backjumping_schedule
+from csp import csp_schedule
+from parallel import count_solutions, parallel_schedule, portfolio_schedule
+
 def is_safe(assignment, subject, period, teacher_availability, teachers):
     if period in assignment.values():
         return False
@@ -23,9 +29,22 @@ def timetable_schedule_util(assignment, subjects, periods, teacher_availability,
 
     return None
 
-def timetable_schedule(subjects, periods, teachers, teacher_availability):
+def backtracking_schedule(subjects, periods, teachers, teacher_availability):
     return timetable_schedule_util({}, subjects, periods, teacher_availability, teachers)
 
+SOLVERS = {
+    'backtracking': backtracking_schedule,
+    'backjumping': backjumping_schedule,
+    'csp': csp_schedule,
+    'parallel': parallel_schedule,
+    'portfolio': portfolio_schedule,
+}
+
+def timetable_schedule(subjects, periods, teachers, teacher_availability, solver='csp'):
+    if solver not in SOLVERS:
+        raise ValueError("Unknown solver: " + str(solver))
+    return SOLVERS[solver](subjects, periods, teachers, teacher_availability)
+
 # Define the subjects, periods, teachers, and teacher availability
 subjects = ["Math", "Science", "English", "History", "PE"]
 periods = [1, 2, 3, 4, 5]
@@ -46,13 +65,27 @@ teacher_availability = {
     "Coach Martin": [1, 2, 3, 5]
 }
 
-# Get the timetable schedule
-solution = timetable_schedule(subjects, periods, teachers, teacher_availability)
+def main():
+    parser = argparse.ArgumentParser(description='Timetable scheduling by backtracking search')
+    parser.add_argument('--solver', choices=sorted(SOLVERS), default='csp')
+    parser.add_argument('--count', action='store_true', help='count every possible timetable instead')
+    args = parser.parse_args()
+
+    if args.count:
+        print("Timetable solutions:", count_solutions(subjects, periods, teachers, teacher_availability))
+        return
+
+    # Get the timetable schedule
+    solution = timetable_schedule(subjects, periods, teachers, teacher_availability, args.solver)
+
+    # Print the timetable solution
+    if solution:
+        print("Timetable Solution:")
+        for subject, period in solution.items():
+            print(f"{subject}: Period {period}")
+    else:
+        print("No timetable solution found.")
+
 
-# Print the timetable solution
-if solution:
-    print("Timetable Solution:")
-    for subject, period in solution.items():
-        print(f"{subject}: Period {period}")
-else:
-    print("No timetable solution found.")
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+import multiprocessing
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, as_completed, wait
+
+from csp import TimetableCSP
+
+# Parallel search over a process pool. The instance is handed to every worker once when
+# the pool starts, so a task only carries its cube or seed, and a shared event tells the
+# searches still running to give up once the answer is known.
+#
+# Cube and conquer splits the search tree at the top: the cubes are the partial
+# assignments of the first few branching subjects that survive propagation. There are
+# several cubes per worker, so a worker that finishes an easy cube early takes the next
+# one instead of idling while the others search.
+
+_instance = None
+_stop = None
+
+
+def _init_worker(instance, stop):
+    global _instance, _stop
+    _instance, _stop = instance, stop
+
+def _start(cube, seed=None):
+    csp = TimetableCSP(*_instance, seed=seed, stop=_stop)
+    if csp.prepare() and csp.assign_all(cube):
+        return csp
+    return None
+
+def _solve_cube(cube):
+    csp = _start(cube)
+    return next(csp.solutions(), None) if csp else None
+
+def _count_cube(cube):
+    csp = _start(cube)
+    return sum(1 for _ in csp.solutions()) if csp else 0
+
+def _solve_seeded(seed):
+    csp = _start([], seed)
+    return next(csp.solutions(), None) if csp else None
+
+
+# Partial assignments, as (subject index, period index) pairs, that together cover every
+# solution. Cubes are split breadth-first until there are at least count of them.
+def make_cubes(instance, count):
+    cubes = [[]]
+    while len(cubes) < count:
+        split, complete = [], True
+        for cube in cubes:
+            csp = TimetableCSP(*instance)
+            if not (csp.prepare() and csp.assign_all(cube)):
+                continue
+            if not csp.unassigned:
+                split.append(cube)
+                continue
+            var, values = csp.split()
+            split.extend(cube + [(var, i)] for i in values)
+            complete = False
+        cubes = split
+        if complete:
+            break
+    return cubes
+
+def _executor(instance, workers, stop):
+    return ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(instance, stop))
+
+def _instance_of(subjects, periods, teachers, teacher_availability):
+    return list(subjects), list(periods), dict(teachers), dict(teacher_availability)
+
+
+def parallel_schedule(subjects, periods, teachers, teacher_availability, workers=None, cubes_per_worker=8):
+    instance = _instance_of(subjects, periods, teachers, teacher_availability)
+    workers = workers or os.cpu_count()
+    stop = multiprocessing.Event()
+    with _executor(instance, workers, stop) as executor:
+        futures = [executor.submit(_solve_cube, cube) for cube in make_cubes(instance, workers * cubes_per_worker)]
+        for future in as_completed(futures):
+            solution = future.result()
+            if solution is not None:
+                stop.set()
+                for other in futures:
+                    other.cancel()
+                return solution
+    return None
+
+# Runs the same search with a different random tie-breaking order in every worker. The
+# first to finish, with a solution or a proof that there is none, decides.
+def portfolio_schedule(subjects, periods, teachers, teacher_availability, workers=None, seeds=None):
+    instance = _instance_of(subjects, periods, teachers, teacher_availability)
+    workers = workers or os.cpu_count()
+    if seeds is None:
+        seeds = [None] + list(range(1, workers))
+    stop = multiprocessing.Event()
+    with _executor(instance, workers, stop) as executor:
+        futures = [executor.submit(_solve_seeded, seed) for seed in seeds]
+        done, _ = wait(futures, return_when=FIRST_COMPLETED)
+        stop.set()
+        for other in futures:
+            other.cancel()
+        return next(iter(done)).result()
+
+# The number of different timetables, counted over the cubes in parallel
+def count_solutions(subjects, periods, teachers, teacher_availability, workers=None, cubes_per_worker=8):
+    instance = _instance_of(subjects, periods, teachers, teacher_availability)
+    workers = workers or os.cpu_count()
+    cubes = make_cubes(instance, workers * cubes_per_worker)
+    with _executor(instance, workers, None) as executor:
+        return sum(executor.map(_count_cube, cubes))
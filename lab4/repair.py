@@ -0,0 +1,94 @@
+import random
+
+from csp import csp_schedule, has_matching
+
+# Incremental re-solving: when a few teachers change availability or subjects change
+# teachers, the previous timetable is repaired instead of solved again from scratch.
+# Subjects whose period is still allowed keep it; the others are placed by min-conflicts
+# local search, which only moves subjects that are in the way. Full search is the
+# fallback when the local search runs out of steps, unless a matching check shows that
+# the changes left no timetable at all.
+
+# Steps of local search allowed per subject that has to move, and at least
+MAX_STEPS_PER_SUBJECT = 100
+MIN_STEPS = 1000
+
+
+# The instance after the changes: teacher_changes maps subjects to their new teacher and
+# availability_changes teachers to their new list of periods
+def apply_changes(teachers, teacher_availability, teacher_changes=None, availability_changes=None):
+    teachers = dict(teachers)
+    teachers.update(teacher_changes or {})
+    teacher_availability = dict(teacher_availability)
+    teacher_availability.update(availability_changes or {})
+    return teachers, teacher_availability
+
+
+# Min-conflicts from a partial assignment: subjects missing from it and subjects sharing
+# a period are in conflict, and a random one of them moves to a period it shares with
+# the fewest others. Returns the number of steps taken, or None when there are still
+# conflicts after max_steps.
+def min_conflicts(assignment, domains, max_steps, rng):
+    holders = {}
+    for subject, period in assignment.items():
+        holders.setdefault(period, []).append(subject)
+
+    conflicted = {subject: None for subject in domains if subject not in assignment}
+    for sharing in holders.values():
+        if len(sharing) > 1:
+            conflicted.update(dict.fromkeys(sharing))
+
+    for step in range(max_steps):
+        if not conflicted:
+            return step
+        subject = rng.choice(list(conflicted))
+        current = assignment.get(subject)
+
+        def cost(period):
+            sharing = holders.get(period, ())
+            return len(sharing) - (subject in sharing)
+
+        best = min(cost(period) for period in domains[subject])
+        choices = [period for period in domains[subject] if cost(period) == best]
+        period = rng.choice(choices)
+
+        if period != current:
+            if current is not None:
+                holders[current].remove(subject)
+                if len(holders[current]) == 1:
+                    conflicted.pop(holders[current][0], None)
+            assignment[subject] = period
+            holders.setdefault(period, []).append(subject)
+
+        sharing = holders[period]
+        if len(sharing) > 1:
+            conflicted.update(dict.fromkeys(sharing))
+        else:
+            conflicted.pop(subject, None)
+
+    return None if conflicted else max_steps
+
+
+def repair_schedule(solution, subjects, periods, teachers, teacher_availability,
+                    teacher_changes=None, availability_changes=None, seed=None):
+    teachers, teacher_availability = apply_changes(teachers, teacher_availability,
+                                                   teacher_changes, availability_changes)
+    allowed = set(periods)
+    domains = {subject: [period for period in teacher_availability.get(teachers[subject], ()) if period in allowed]
+               for subject in subjects}
+    if not all(domains.values()):
+        return None
+
+    # Keep every assignment the changes left valid
+    assignment = {subject: solution[subject] for subject in subjects
+                  if subject in solution and solution[subject] in domains[subject]}
+    moving = len(subjects) - len(assignment)
+    if moving == 0:
+        return {subject: assignment[subject] for subject in subjects}
+
+    steps = max(MIN_STEPS, MAX_STEPS_PER_SUBJECT * moving)
+    if min_conflicts(assignment, domains, steps, random.Random(seed)) is not None:
+        return {subject: assignment[subject] for subject in subjects}
+    if not has_matching(subjects, periods, teachers, teacher_availability):
+        return None
+    return csp_schedule(subjects, periods, teachers, teacher_availability)